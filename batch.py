@@ -0,0 +1,187 @@
+'''
+批量修复：一次处理多个用户 / 设备的导出文件
+
+输入可以是目录（递归查找 *.csv），也可以是清单文件：
+  - 每行一个路径（# 开头为注释），或
+  - 带表头的 CSV，必须有 input 列，可选 output 列（该文件的输出目录）
+  清单中的相对路径（input 和 output）都相对于清单文件所在目录
+
+文件按大小从大到小提交到进程池，避免最后只剩一个大文件在跑；
+单个文件出错只记录在汇总表中，不影响其他文件；子进程被杀死（如内存耗尽）时，
+受影响的文件逐个在单独的进程中重试，再次崩溃才记为失败。
+'''
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from profiling import get_profiler
+from run import DECISIONS
+
+# ================= 配置 =================
+INPUT = './data'                    # 目录或清单文件
+OUTPUT_DIR = './output/batch'
+PATTERN = '*.csv'
+MAX_WORKERS = os.cpu_count() or 1
+CUT = False                         # 是否应用 cut_gps_data.py 的截取配置
+WRITE_DEBUG = False
+SUMMARY_FILE = './output/batch_summary.csv'
+# =======================================
+
+SUMMARY_FIELDS = ["input", "status", "bytes", "points", *DECISIONS, "seconds", "output_dir", "error"]
+
+
+def _read_manifest(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+    if not lines:
+        return []
+    base = Path(path).resolve().parent
+    header = next(csv.reader([lines[0]]))
+    if 'input' in header:
+        entries = []
+        for row in csv.DictReader(lines):
+            out = (row.get('output') or '').strip()
+            entries.append((base / row['input'].strip(), base / out if out else None))
+        return entries
+    return [(base / line.strip(), None) for line in lines]
+
+
+def collect_jobs(source=INPUT, output_dir=OUTPUT_DIR):
+    """返回 [(输入文件, 输出目录)]，输出目录下再按文件名建子目录"""
+    source = Path(source)
+    output_dir = Path(output_dir)
+    jobs = []
+    if source.is_dir():
+        for path in sorted(source.rglob(PATTERN)):
+            if path.name.startswith(('.', '~')):
+                continue
+            # 保留相对目录结构，不同用户的同名导出不会互相覆盖
+            jobs.append((path, output_dir / path.parent.relative_to(source)))
+    else:
+        used = set()
+        for path, out in _read_manifest(source):
+            if out is None:
+                out = output_dir
+                key = (out, path.stem)
+                n = 1
+                while key in used:
+                    out = output_dir / f"{n}"
+                    key = (out, path.stem)
+                    n += 1
+                used.add(key)
+            jobs.append((path, Path(out)))
+    return jobs
+
+
+def _run_one(input_path, output_dir, cut, write_debug, profile=False):
+    """子进程入口：任何异常都转成结果行，单个文件失败不影响整批"""
+    from watch import repair_job
+
+    row = {"input": str(input_path), "output_dir": str(Path(output_dir) / Path(input_path).stem)}
+    t0 = time.perf_counter()
+    try:
+        stats = repair_job(input_path, output_dir, cut=cut, write_debug=write_debug, profile=profile)
+        row.update(status="ok", points=stats['points'], **stats['decisions'])
+        if 'profile' in stats:
+            row['profile'] = stats['profile']
+    except Exception as exc:
+        row.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+    row["seconds"] = round(time.perf_counter() - t0, 3)
+    return row
+
+
+def _submit(pool, job, cut, write_debug):
+    path, out = job
+    return pool.submit(_run_one, str(path), str(out), cut, write_debug, get_profiler().enabled)
+
+
+def _collect(futures, finish):
+    """futures 为 {future: 任务}，每完成一个调用 finish(输入文件, 结果行)；返回因进程池损坏而没有结果的任务"""
+    broken = []
+    for future in as_completed(futures):
+        path = futures[future][0]
+        try:
+            row = future.result()
+        except BrokenProcessPool:
+            broken.append(futures[future])
+            continue
+        except Exception as exc:
+            row = {"input": str(path), "status": "failed", "error": f"{type(exc).__name__}: {exc}"}
+        finish(path, row)
+    return broken
+
+
+def run_batch(source=INPUT, output_dir=OUTPUT_DIR, max_workers=MAX_WORKERS,
+              summary_file=SUMMARY_FILE, cut=CUT, write_debug=WRITE_DEBUG):
+    jobs = collect_jobs(source, output_dir)
+    sizes = {}
+    for path, _ in jobs:
+        try:
+            sizes[path] = path.stat().st_size
+        except OSError:
+            sizes[path] = 0
+    # 最大的文件最先开始（LPT 调度）
+    jobs.sort(key=lambda job: sizes[job[0]], reverse=True)
+    print(f"共 {len(jobs)} 个文件，{sum(sizes.values()) / 1e6:.1f} MB，进程数 {max_workers}")
+
+    t0 = time.perf_counter()
+    rows = []
+
+    def finish(path, row):
+        # 子进程的耗时统计合并到主进程的报告中
+        report = row.pop("profile", None)
+        if report:
+            get_profiler().merge(report)
+        row["bytes"] = sizes[path]
+        rows.append(row)
+        print(f"[{len(rows)}/{len(jobs)}] {row['status']}: {path} {row.get('seconds', '')}s")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        broken = _collect({_submit(pool, job, cut, write_debug): job for job in jobs}, finish)
+
+    # 一个子进程崩溃后整个进程池不能再用，池中尚未完成的文件都会失败，不一定是它们自己的问题：
+    # 每个文件单独一个进程重试（每次最多 max_workers 个），再次崩溃的才记为失败
+    for start in range(0, len(broken), max_workers):
+        wave = broken[start:start + max_workers]
+        pools = [ProcessPoolExecutor(max_workers=1) for _ in wave]
+        try:
+            crashed = _collect(
+                {_submit(single, job, cut, write_debug): job for single, job in zip(pools, wave)}, finish
+            )
+        finally:
+            for single in pools:
+                single.shutdown()
+        for path, _ in crashed:
+            finish(path, {"input": str(path), "status": "failed", "error": "BrokenProcessPool: 子进程异常退出"})
+    wall = time.perf_counter() - t0
+
+    rows.sort(key=lambda r: r["input"])
+    summary_file = Path(summary_file)
+    summary_file.parent.mkdir(parents=True, exist_ok=True)
+    with summary_file.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            default = 0 if row["status"] == "ok" else ''
+            writer.writerow({k: row.get(k, default if k in DECISIONS else '') for k in SUMMARY_FIELDS})
+
+    ok = [r for r in rows if r["status"] == "ok"]
+    busy = sum(r.get("seconds", 0) for r in rows)
+    print("-" * 40)
+    print(f"成功 {len(ok)} / 失败 {len(rows) - len(ok)}")
+    print(f"总点数: {sum(r['points'] for r in ok)}")
+    print(f"墙钟时间: {wall:.2f}s，累计处理时间: {busy:.2f}s")
+    print(f"汇总表: {summary_file}")
+    print("-" * 40)
+    return rows
+
+
+def main():
+    run_batch()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+GCJ-02 → WGS-84 逆变换各精度模式的速度与残差对比
+
+对同一批坐标分别运行 run.gcj02_to_wgs84_array 的各个模式（以及原来的逐点版本），输出：
+  - 每秒点数
+  - 残差：把结果再正向转回 GCJ-02，与输入的距离（米）
+  - 误差：与收敛解（exact，容差 1e-13）的距离（米）
+据此在 run.py 的 GCJ02_INVERSE 中选择够用的精度。
+'''
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+import run
+from convert_csv import wgs84_to_gcj02_array
+
+# ================= 配置 =================
+INPUT_FILE = './output/cut.csv'    # 取其中的 longitude / latitude；文件不存在时在中国范围内随机取点
+RANDOM_POINTS = 200000
+REPEAT = 3                         # 每个模式重复次数，取最快一次
+# (名称, 模式, 迭代次数, 容差)
+MODES = [
+    ("fast", "fast", None, None),
+    ("iter x2", "iter", 2, None),
+    ("iter x3", "iter", 3, None),
+    ("exact 1e-9", "exact", None, 1e-9),
+    ("exact 1e-12", "exact", None, 1e-12),
+]
+SCALAR_POINTS = 50000              # 逐点版本只测这么多点（太慢）
+# =======================================
+
+
+def _distance(lon1, lat1, lon2, lat2):
+    """向量化 Haversine（米），与 run.get_distance 相同"""
+    R = 6371000
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def load_points(input_file=INPUT_FILE):
+    if Path(input_file).exists():
+        from ingest import read_export
+
+        df = read_export(input_file, columns=['longitude', 'latitude']).dropna()
+        lon = df['longitude'].to_numpy(dtype=np.float64)
+        lat = df['latitude'].to_numpy(dtype=np.float64)
+        # 只有境内的点才存在坐标系混用
+        inside = (lon >= 72.004) & (lon <= 137.8347) & (lat >= 0.8293) & (lat <= 55.8271)
+        if inside.any():
+            return lon[inside], lat[inside], input_file
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(73.0, 135.0, RANDOM_POINTS)
+    lat = rng.uniform(18.0, 53.0, RANDOM_POINTS)
+    return lon, lat, f"随机 {RANDOM_POINTS} 点"
+
+
+def _best_time(func, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _stats(lon, lat, out_lon, out_lat, ref_lon, ref_lat):
+    back_lon, back_lat = wgs84_to_gcj02_array(out_lon, out_lat, china_only=False)
+    residual = _distance(back_lon, back_lat, lon, lat)
+    error = _distance(out_lon, out_lat, ref_lon, ref_lat)
+    return residual, error
+
+
+def benchmark(lon, lat, modes=MODES, repeat=REPEAT):
+    ref_lon, ref_lat = run.gcj02_to_wgs84_array(lon, lat, "exact", 50, 1e-13)
+    rows = []
+    for name, mode, iterations, tolerance in modes:
+        seconds, (out_lon, out_lat) = _best_time(
+            lambda: run.gcj02_to_wgs84_array(lon, lat, mode, iterations, tolerance), repeat
+        )
+        residual, error = _stats(lon, lat, out_lon, out_lat, ref_lon, ref_lat)
+        rows.append((name, len(lon) / seconds, residual, error))
+
+    # 原来的逐点版本（run.gcj02_to_wgs84），作为速度基准
+    k = min(len(lon), SCALAR_POINTS)
+    seconds, result = _best_time(
+        lambda: [run.gcj02_to_wgs84(x, y) for x, y in zip(lon[:k].tolist(), lat[:k].tolist())], 1
+    )
+    out = np.array(result, dtype=np.float64).reshape(-1, 2)
+    residual, error = _stats(lon[:k], lat[:k], out[:, 0], out[:, 1], ref_lon[:k], ref_lat[:k])
+    rows.append(("fast（逐点）", k / seconds, residual, error))
+    return rows
+
+
+def main():
+    lon, lat, source = load_points()
+    print(f"数据: {source}，{len(lon)} 点")
+    print(f"{'模式':<14}{'点/秒':>14}{'残差最大(m)':>14}{'残差均值(m)':>14}{'误差最大(m)':>14}{'误差P99(m)':>14}")
+    for name, speed, residual, error in benchmark(lon, lat):
+        print(f"{name:<14}{speed:>14,.0f}{residual.max():>14.2e}{residual.mean():>14.2e}"
+              f"{error.max():>14.2e}{np.percentile(error, 99):>14.2e}")
+
+
+if __name__ == '__main__':
+    main()
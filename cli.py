@@ -0,0 +1,301 @@
+'''
+统一命令行入口
+
+  python cli.py cut      --mode time --start "2025-03-16 10:00:00" --end "2025-03-18 23:59:00"
+  python cli.py repair   --input ./output/cut.csv
+  python cli.py convert  --input ./output/gps_data_perfect.csv
+  python cli.py plot     --engine pydeck
+  python cli.py pipeline --input ./data/export.csv --sorted --debug
+  python cli.py serve    --port 8765
+  python cli.py watch    --dir ./data --workers 4
+  python cli.py batch    ./data --workers 8
+  python cli.py time     1650072179000 "2022-04-16 03:22:00"
+  python cli.py check    --cases 500 --engines dwell chunked
+  python cli.py repair   --store ./output/store      追加到轨迹库（store.py）
+  python cli.py plot     --input ./output/store --from 1742112000000 --to 1742198400000
+
+各子命令只在执行时才导入对应模块，pandas / folium / pydeck 不会拖慢 --help 和时间换算。
+未给出的参数沿用各脚本顶部配置区的默认值。
+--profile report.json 放在子命令之前，输出各阶段耗时报告（见 profiling.py）。
+'''
+import argparse
+import sys
+
+
+def _configure(module, **values):
+    """用命令行参数覆盖脚本配置区的常量（None 表示沿用默认值）"""
+    for name, value in values.items():
+        if value is not None:
+            setattr(module, name, value)
+
+
+def cmd_cut(args):
+    import os
+    import cut_gps_data
+
+    output_dir = os.path.dirname(args.output) if args.output else None
+    _configure(
+        cut_gps_data,
+        input_csv=args.input,
+        output_csv=args.output,
+        output_dir=output_dir or None,
+        MODE=args.mode,
+        LINE_START=args.line_start,
+        LINE_END=args.line_end,
+        START_TIME=args.start,
+        END_TIME=args.end,
+        TIMEZONE_OFFSET=args.tz,
+    )
+    cut_gps_data.main()
+
+
+def cmd_repair(args):
+    import run
+
+    _configure(
+        run,
+        JUMP_DETECT_THRESHOLD=args.jump,
+        SMOOTH_THRESHOLD=args.smooth,
+        MIN_IMPROVEMENT=args.min_improvement,
+        AMBIGUOUS_THRESHOLD=args.ambiguous,
+        LOOKAHEAD_GAIN=args.lookahead_gain,
+        SHARP_TURN_DEG=args.sharp_turn,
+        SHARP_GAIN_MULTIPLIER=args.sharp_multiplier,
+        STORE_DIR=args.store,
+    )
+    run.auto_repair_trajectory(
+        args.input or run.INPUT_FILE,
+        args.output or run.OUTPUT_FILE,
+        args.debug or run.DEBUG_FILE,
+    )
+
+
+def cmd_convert(args):
+    import convert_csv
+
+    _configure(
+        convert_csv,
+        INPUT_FILE=args.input,
+        OUTPUT_DIR=args.output_dir,
+        CONVERT_CHINA_TO_GCJ02=True if args.gcj02 else None,
+        TIME_FROM=args.time_from,
+        TIME_TO=args.time_to,
+    )
+    convert_csv.main()
+
+
+def cmd_plot(args):
+    if args.engine == 'pydeck':
+        import plot_pydeck
+
+        _configure(plot_pydeck, TIME_FROM=args.time_from, TIME_TO=args.time_to)
+        plot_pydeck.visualize_pydeck(
+            args.input or plot_pydeck.INPUT_FILE,
+            args.output or plot_pydeck.OUTPUT_HTML,
+        )
+    else:
+        import plot
+
+        _configure(plot, OUTPUT_HTML=args.output, TIME_FROM=args.time_from, TIME_TO=args.time_to)
+        plot.visualize_before_after(args.input or plot.INPUT_FILE)
+
+
+def cmd_pipeline(args):
+    import pipeline
+
+    _configure(
+        pipeline,
+        INPUT_FILE=args.input,
+        OUTPUT_DIR=args.output_dir,
+        CHUNK_SIZE=args.chunk_size,
+        CUT=False if args.no_cut else None,
+        INPUT_SORTED=True if args.sorted else None,
+        WRITE_CUT=True if args.write_cut else None,
+        WRITE_DEBUG=True if args.debug else None,
+        WRITE_CONVERTED=False if args.no_convert else None,
+        PLOT=args.plot,
+        STORE_DIR=args.store,
+    )
+    pipeline.main()
+
+
+def cmd_serve(args):
+    import serve
+
+    _configure(serve, HOST=args.host, PORT=args.port)
+    serve.serve(
+        args.input or serve.INPUT_FILE,
+        args.debug or serve.DEBUG_FILE,
+        serve.HOST,
+        serve.PORT,
+    )
+
+
+def cmd_watch(args):
+    import asyncio
+    import watch
+
+    _configure(watch, POLL_SECONDS=args.poll, STABLE_SECONDS=args.stable, STATUS_FILE=args.status)
+    daemon = watch.WatchDaemon(
+        args.dir or watch.WATCH_DIR,
+        args.output_dir or watch.OUTPUT_DIR,
+        args.workers or watch.MAX_WORKERS,
+    )
+    asyncio.run(daemon.run())
+
+
+def cmd_batch(args):
+    import batch
+
+    batch.run_batch(
+        args.source or batch.INPUT,
+        args.output_dir or batch.OUTPUT_DIR,
+        args.workers or batch.MAX_WORKERS,
+        args.summary or batch.SUMMARY_FILE,
+        cut=args.cut or batch.CUT,
+        write_debug=args.debug or batch.WRITE_DEBUG,
+    )
+
+
+def cmd_time(args):
+    import geotime2time
+    import time2geotime
+
+    offset = args.tz if args.tz is not None else time2geotime.TIMEZONE_OFFSET
+    for value in args.values:
+        # 纯数字视为 geoTime（毫秒），否则视为 "年-月-日 时:分:秒"
+        if value.lstrip('-').isdigit():
+            print(f"{value} -> {geotime2time.geotime_to_custom_date(value, offset)}")
+        else:
+            print(f"{value} -> {time2geotime.time_to_geotime(value, offset)}")
+
+
+def cmd_check(args):
+    import equivalence
+
+    _configure(
+        equivalence,
+        INPUT_FILES=args.input,
+        ENGINES_TO_TEST=args.engines,
+        FUZZ_CASES=args.cases,
+        SEED=args.seed,
+    )
+    equivalence.main()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='GPS 轨迹坐标系修复工具')
+    parser.add_argument('--profile', metavar='REPORT_JSON', help='记录各阶段耗时并写出 JSON 报告')
+    sub = parser.add_subparsers(dest='command', required=True, metavar='<command>')
+
+    p = sub.add_parser('cut', help='截取时间段或行号范围（cut_gps_data.py）')
+    p.add_argument('--input', help='原始 CSV 或轨迹库目录')
+    p.add_argument('--output', help='输出 CSV（默认 ./output/cut.csv）')
+    p.add_argument('--mode', choices=['line', 'time'])
+    p.add_argument('--start', help='起始时间 "年-月-日 时:分:秒"')
+    p.add_argument('--end', help='结束时间 "年-月-日 时:分:秒"')
+    p.add_argument('--line-start', type=int, help='起始行（表头为第 1 行）')
+    p.add_argument('--line-end', type=int, help='结束行')
+    p.add_argument('--tz', type=float, help='UTC 偏移（小时）')
+    p.set_defaults(func=cmd_cut)
+
+    p = sub.add_parser('repair', help='修复坐标系跳变（run.py）')
+    p.add_argument('--input', help='输入 CSV')
+    p.add_argument('--output', help='修复后的 CSV')
+    p.add_argument('--debug', help='决策日志 CSV')
+    p.add_argument('--jump', type=float, help='JUMP_DETECT_THRESHOLD（米）')
+    p.add_argument('--smooth', type=float, help='SMOOTH_THRESHOLD（米）')
+    p.add_argument('--min-improvement', type=float, help='MIN_IMPROVEMENT（米）')
+    p.add_argument('--ambiguous', type=float, help='AMBIGUOUS_THRESHOLD（米）')
+    p.add_argument('--lookahead-gain', type=float, help='LOOKAHEAD_GAIN（米）')
+    p.add_argument('--sharp-turn', type=float, help='SHARP_TURN_DEG（度）')
+    p.add_argument('--sharp-multiplier', type=float, help='SHARP_GAIN_MULTIPLIER')
+    p.add_argument('--store', help='同时追加到轨迹库目录')
+    p.set_defaults(func=cmd_repair)
+
+    p = sub.add_parser('convert', help='转换为一生足迹格式（convert_csv.py）')
+    p.add_argument('--input', help='修复后的 CSV 或轨迹库目录')
+    p.add_argument('--output-dir', help='输出目录')
+    p.add_argument('--gcj02', action='store_true', help='中国境内坐标转为 GCJ-02')
+    p.add_argument('--from', dest='time_from', type=int, help='起始 geoTime（毫秒，仅轨迹库输入）')
+    p.add_argument('--to', dest='time_to', type=int, help='结束 geoTime（毫秒，仅轨迹库输入）')
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('plot', help='生成修复前后对比地图（plot.py / plot_pydeck.py）')
+    p.add_argument('--input', help='修复后的 CSV 或轨迹库目录')
+    p.add_argument('--output', help='输出 HTML')
+    p.add_argument('--engine', choices=['folium', 'pydeck'], default='folium')
+    p.add_argument('--from', dest='time_from', type=int, help='起始 geoTime（毫秒）')
+    p.add_argument('--to', dest='time_to', type=int, help='结束 geoTime（毫秒）')
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser('pipeline', help='一次完成截取、修复、转换、绘图（pipeline.py）')
+    p.add_argument('--input', help='原始 CSV')
+    p.add_argument('--output-dir', help='输出目录')
+    p.add_argument('--chunk-size', type=int, help='每块行数')
+    p.add_argument('--no-cut', action='store_true', help='不应用 cut_gps_data.py 的截取配置')
+    p.add_argument('--sorted', action='store_true', help='输入已按 geoTime 升序，按块流式处理')
+    p.add_argument('--write-cut', action='store_true', help='同时写出 cut.csv')
+    p.add_argument('--debug', action='store_true', help='同时写出 debug_decisions.csv')
+    p.add_argument('--no-convert', action='store_true', help='不写出转换后的 CSV')
+    p.add_argument('--plot', choices=['folium', 'pydeck'], help='生成地图')
+    p.add_argument('--store', help='同时追加到轨迹库目录')
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser('serve', help='本地轨迹查询服务（serve.py）')
+    p.add_argument('--input', help='修复后的 CSV 或轨迹库目录')
+    p.add_argument('--debug', help='决策日志 CSV')
+    p.add_argument('--host')
+    p.add_argument('--port', type=int)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('watch', help='监视目录，自动修复新导出的文件（watch.py）')
+    p.add_argument('--dir', help='监视目录')
+    p.add_argument('--output-dir', help='输出目录')
+    p.add_argument('--workers', type=int, help='进程池大小')
+    p.add_argument('--poll', type=float, help='扫描间隔（秒）')
+    p.add_argument('--stable', type=float, help='文件多久不变视为写完（秒）')
+    p.add_argument('--status', help='状态 JSON 文件')
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser('batch', help='批量并行修复多个文件（batch.py）')
+    p.add_argument('source', nargs='?', help='目录或清单文件')
+    p.add_argument('--output-dir', help='输出目录')
+    p.add_argument('--workers', type=int, help='进程池大小')
+    p.add_argument('--summary', help='汇总表 CSV')
+    p.add_argument('--cut', action='store_true', help='应用 cut_gps_data.py 的截取配置')
+    p.add_argument('--debug', action='store_true', help='同时写出 debug_decisions.csv')
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser('time', help='geoTime 与本地时间互转')
+    p.add_argument('values', nargs='+', help='geoTime 毫秒，或 "年-月-日 时:分:秒"')
+    p.add_argument('--tz', type=float, help='UTC 偏移（小时，默认 2）')
+    p.set_defaults(func=cmd_time)
+
+    p = sub.add_parser('check', help='与冻结的参考实现逐点对比修复结果（equivalence.py）')
+    p.add_argument('--input', nargs='+', help='参与对比的真实数据 CSV')
+    p.add_argument('--engines', nargs='+', help='scalar / dwell / chunked / exact_inverse')
+    p.add_argument('--cases', type=int, help='随机轨迹条数')
+    p.add_argument('--seed', type=int, help='随机种子')
+    p.set_defaults(func=cmd_check)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.profile:
+        args.func(args)
+        return
+
+    import profiling
+
+    profiler = profiling.enable(args.command)
+    try:
+        args.func(args)
+    finally:
+        profiler.write(args.profile)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
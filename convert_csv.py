@@ -5,13 +5,32 @@ import csv
 import math
 from pathlib import Path
 
+from profiling import get_profiler
+
 # ================= Config =================
 INPUT_FILE = "output/gps_data_perfect.csv"
 OUTPUT_DIR = "output"
 OUTPUT_SUFFIX = "_converted"
 CONVERT_CHINA_TO_GCJ02 = False
+# INPUT_FILE 为轨迹库目录（store.py）时只转换该时间段（geoTime 毫秒，None 为不限）
+TIME_FROM = None
+TIME_TO = None
 # =========================================
 
+FIELDNAMES = [
+    "dataTime",
+    "locType",
+    "longitude",
+    "latitude",
+    "heading",
+    "accuracy",
+    "speed",
+    "distance",
+    "isBackForeground",
+    "stepType",
+    "altitude",
+]
+
 
 def out_of_china(lat: float, lon: float) -> bool:
     return lon < 72.004 or lon > 137.8347 or lat < 0.8293 or lat > 55.8271
@@ -51,6 +70,48 @@ def wgs84_to_gcj02(lon: float, lat: float) -> tuple[float, float]:
     return mglon, mglat
 
 
+def wgs84_to_gcj02_array(lon, lat, china_only: bool = True):
+    """
+    wgs84_to_gcj02 的向量化版本，输入 / 输出为 numpy 数组
+    china_only=False 时境外的点也做偏移（run.py 的逆变换不区分境内外）
+    """
+    import numpy as np
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    a = 6378245.0
+    ee = 0.00669342162296594323
+    pi = math.pi
+
+    x = lon - 105.0
+    y = lat - 35.0
+    common = (20.0 * np.sin(6.0 * x * pi) + 20.0 * np.sin(2.0 * x * pi)) * 2.0 / 3.0
+
+    dlat = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    dlat += common
+    dlat += (20.0 * np.sin(y * pi) + 40.0 * np.sin(y / 3.0 * pi)) * 2.0 / 3.0
+    dlat += (160.0 * np.sin(y / 12.0 * pi) + 320.0 * np.sin(y * pi / 30.0)) * 2.0 / 3.0
+
+    dlon = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    dlon += common
+    dlon += (20.0 * np.sin(x * pi) + 40.0 * np.sin(x / 3.0 * pi)) * 2.0 / 3.0
+    dlon += (150.0 * np.sin(x / 12.0 * pi) + 300.0 * np.sin(x / 30.0 * pi)) * 2.0 / 3.0
+
+    radlat = lat / 180.0 * pi
+    magic = np.sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * pi)
+    dlon = (dlon * 180.0) / (a / sqrtmagic * np.cos(radlat) * pi)
+    mglat = lat + dlat
+    mglon = lon + dlon
+    if china_only:
+        outside = (lon < 72.004) | (lon > 137.8347) | (lat < 0.8293) | (lat > 55.8271)
+        mglon = np.where(outside, lon, mglon)
+        mglat = np.where(outside, lat, mglat)
+    return mglon, mglat
+
+
 def _to_float(value: str) -> float | None:
     try:
         return float(value)
@@ -81,6 +142,45 @@ def convert_row(row: dict) -> dict:
     }
 
 
+def convert_frame(df):
+    """convert_row 的整块版本：输入 pandas DataFrame，输出同样字段的 DataFrame"""
+    with get_profiler().stage('convert', points=len(df)):
+        return _convert_frame(df)
+
+
+def _convert_frame(df):
+    import pandas as pd
+
+    def column(name, default=""):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+    lon = column("longitude")
+    lat = column("latitude")
+    if CONVERT_CHINA_TO_GCJ02:
+        lon_num = pd.to_numeric(lon, errors="coerce")
+        lat_num = pd.to_numeric(lat, errors="coerce")
+        valid = lon_num.notna() & lat_num.notna()
+        converted = [wgs84_to_gcj02(x, y) for x, y in zip(lon_num[valid], lat_num[valid])]
+        lon = lon.astype(object)
+        lat = lat.astype(object)
+        lon[valid] = [c[0] for c in converted]
+        lat[valid] = [c[1] for c in converted]
+
+    return pd.DataFrame({
+        "dataTime": column("geoTime"),
+        "locType": column("locationType"),
+        "longitude": lon,
+        "latitude": lat,
+        "heading": column("course"),
+        "accuracy": column("horizontalAccuracy"),
+        "speed": column("speed"),
+        "distance": "0",
+        "isBackForeground": "0",
+        "stepType": "0",
+        "altitude": column("altitude"),
+    }, columns=FIELDNAMES)
+
+
 def main() -> None:
     base_dir = Path(__file__).resolve().parent
     input_path = base_dir / INPUT_FILE
@@ -89,27 +189,34 @@ def main() -> None:
 
     output_path = output_dir / f"{input_path.stem}{OUTPUT_SUFFIX}.csv"
 
-    with input_path.open("r", encoding="utf-8", newline="") as infile:
+    if input_path.is_dir():
+        _convert_store(input_path, output_path)
+        return
+
+    # 读取、转换、写出逐行交错进行，整体计为一个阶段
+    with get_profiler().stage('convert') as stage, \
+            input_path.open("r", encoding="utf-8", newline="") as infile:
         reader = csv.DictReader(infile)
-        fieldnames = [
-            "dataTime",
-            "locType",
-            "longitude",
-            "latitude",
-            "heading",
-            "accuracy",
-            "speed",
-            "distance",
-            "isBackForeground",
-            "stepType",
-            "altitude",
-        ]
         with output_path.open("w", encoding="utf-8", newline="") as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(outfile, fieldnames=FIELDNAMES)
             writer.writeheader()
+            n = 0
             for row in reader:
                 writer.writerow(convert_row(row))
+                n += 1
+        stage.points = n
+
+    print(f"Wrote {output_path}")
+
+
+def _convert_store(store_path, output_path):
+    import store
 
+    with get_profiler().stage('read_store'):
+        df = store.TrajectoryStore(store_path).to_frame(TIME_FROM, TIME_TO)
+    out = convert_frame(store.extras_as_text(df))
+    with get_profiler().stage('write_output', points=len(out)):
+        out.to_csv(output_path, index=False, lineterminator="\r\n")
     print(f"Wrote {output_path}")
 
 
@@ -5,9 +5,11 @@ import csv
 import os
 from datetime import datetime, timezone, timedelta
 
+from profiling import get_profiler
+
 # ================= 配置区 =================
 
-input_csv = "./data/灵敢足迹（2025.12.22）.csv"
+input_csv = "./data/灵敢足迹（2025.12.22）.csv"   # 也可以是轨迹库目录（store.py）
 output_dir = "./output"
 output_csv = os.path.join(output_dir, "cut.csv")
 
@@ -35,42 +37,97 @@ def time_to_geotime(time_str):
     return int(dt.timestamp() * 1000)
 
 
-os.makedirs(output_dir, exist_ok=True)
+def cut_frame(df, row_offset=0):
+    """
+    对一个 DataFrame 块做同样的截取，供流式管线使用
+    row_offset: 该块第一行在原文件数据行中的序号（从 0 开始，不含表头）
+    """
+    with get_profiler().stage('cut', points=len(df)):
+        if MODE == "line":
+            # 数据行 k 在文件中是第 k + 2 行（表头为第 1 行）
+            lo = max(LINE_START - 2 - row_offset, 0)
+            hi = max(LINE_END - 1 - row_offset, 0)
+            return df.iloc[lo:hi]
 
-with open(input_csv, newline='', encoding="utf-8") as f:
-    reader = list(csv.reader(f))
+        if MODE == "time":
+            import pandas as pd  # 命令行截取本身只用标准库，这里按需导入
 
-header = reader[0]
-data = reader[1:]
+            start_ts = time_to_geotime(START_TIME)
+            end_ts = time_to_geotime(END_TIME)
+            ts = pd.to_numeric(df[GEOTIME_COLUMN], errors="coerce")
+            return df[(ts >= start_ts) & (ts <= end_ts)]
 
-# ================= 按行截取 =================
-if MODE == "line":
-    selected = reader[LINE_START - 1 : LINE_END]
+    raise ValueError("MODE 只能是 'line' 或 'time'")
 
-# ================= 按时间截取 =================
-elif MODE == "time":
-    start_ts = time_to_geotime(START_TIME)
-    end_ts = time_to_geotime(END_TIME)
 
-    geo_idx = header.index(GEOTIME_COLUMN)
+def cut_store(path):
+    """从轨迹库截取：时间模式直接按稀疏索引取切片，只输出原始字段"""
+    import store
 
-    selected_data = []
-    for row in data:
-        try:
-            ts = int(row[geo_idx])
-            if start_ts <= ts <= end_ts:
-                selected_data.append(row)
-        except ValueError:
-            continue
+    trajectory_store = store.TrajectoryStore(path)
+    columns = [c for c in trajectory_store.columns
+               if c not in ("clean_longitude", "clean_latitude", "decision")]
+    if MODE == "line":
+        df = trajectory_store.to_frame(columns=columns)
+        return store.extras_as_text(df.iloc[max(LINE_START - 2, 0):max(LINE_END - 1, 0)].copy())
+    if MODE == "time":
+        df = trajectory_store.to_frame(time_to_geotime(START_TIME), time_to_geotime(END_TIME), columns)
+        return store.extras_as_text(df)
+    raise ValueError("MODE 只能是 'line' 或 'time'")
 
-    selected = [header] + selected_data
 
-else:
-    raise ValueError("MODE 只能是 'line' 或 'time'")
+def main():
+    profiler = get_profiler()
+    os.makedirs(output_dir, exist_ok=True)
+
+    if os.path.isdir(input_csv):
+        with profiler.stage('cut'):
+            df = cut_store(input_csv)
+        with profiler.stage('write_output', points=len(df)):
+            df.to_csv(output_csv, index=False)
+        print("输出完成:", output_csv)
+        return
+
+    with profiler.stage('read_csv'), open(input_csv, newline='', encoding="utf-8") as f:
+        reader = list(csv.reader(f))
+
+    header = reader[0]
+    data = reader[1:]
+
+    with profiler.stage('cut', points=len(data)):
+        # ================= 按行截取 =================
+        if MODE == "line":
+            selected = reader[LINE_START - 1 : LINE_END]
+
+        # ================= 按时间截取 =================
+        elif MODE == "time":
+            start_ts = time_to_geotime(START_TIME)
+            end_ts = time_to_geotime(END_TIME)
+
+            geo_idx = header.index(GEOTIME_COLUMN)
+
+            selected_data = []
+            for row in data:
+                try:
+                    ts = int(row[geo_idx])
+                    if start_ts <= ts <= end_ts:
+                        selected_data.append(row)
+                except ValueError:
+                    continue
+
+            selected = [header] + selected_data
+
+        else:
+            raise ValueError("MODE 只能是 'line' 或 'time'")
+
+    # ================= 输出 =================
+    with profiler.stage('write_output', points=len(selected)), \
+            open(output_csv, "w", newline='', encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerows(selected)
+
+    print("输出完成:", output_csv)
 
-# ================= 输出 =================
-with open(output_csv, "w", newline='', encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerows(selected)
 
-print("输出完成:", output_csv)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
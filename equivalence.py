@@ -0,0 +1,474 @@
+'''
+修复引擎差分校验
+
+把原始的逐点修复算法冻结为参考实现（本文件中的 reference_repair，不调用 run.py 的任何计算函数），
+在真实数据和随机生成的轨迹上，与 run.py 的各种加速实现逐点对比：
+  - 每个点的 repair_note、decision、clean_longitude / clean_latitude 必须完全一致
+  - 出现差异时报告第一个不一致的点，以及两边完整的 debug 记录，并把该输入保存下来便于复现
+  - 同时报告各实现相对参考实现的加速比
+
+阈值参数（JUMP_DETECT_THRESHOLD 等）在运行时从 run.py 读取，两边始终使用同一组参数。
+任何改动 run.py 性能的提交，都应先跑一遍本脚本。
+'''
+import json
+import math
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import run
+from convert_csv import wgs84_to_gcj02
+from ingest import REPAIR_COLUMNS, read_export
+
+# ================= 配置 =================
+INPUT_FILES = ['./output/cut.csv']     # 真实数据，文件存在才参与对比
+ENGINES_TO_TEST = ["scalar", "dwell", "chunked"]
+FUZZ_CASES = 300                       # 随机轨迹条数
+FUZZ_MAX_POINTS = 2000                 # 随机轨迹最大点数
+FUZZ_SHORT_RATE = 0.3                  # 1~6 个点的极短轨迹比例（覆盖末尾 i+1 / i+2 前瞻边界）
+FUZZ_BAD_TIME_RATE = 0.1               # 含空 / 非数字 geoTime 的轨迹比例（经 CSV 读取路径）
+SEED = 0
+CHUNK_SIZES = (1, 2, 3, 7, 64)         # chunked 引擎的块大小，按轨迹长度轮换
+MAX_CHUNKS = 50                        # 每条轨迹最多分这么多块（块太小时按此放大）
+FAIL_DIR = './output/equivalence'      # 出现差异时保存输入数据
+# =======================================
+
+
+# ---------------- 冻结的参考实现 ----------------
+# 以下三个函数拷贝自 run.py 的原始版本（只删去了注释），run.py 后续的优化不会影响参考结果
+
+def _ref_gcj02_to_wgs84(lng, lat):
+    pi = 3.1415926535897932384626
+    a = 6378245.0
+    ee = 0.00669342162296594323
+
+    def transform_lat(x, y):
+        ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+        ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
+        ret += (20.0 * math.sin(y * pi) + 40.0 * math.sin(y / 3.0 * pi)) * 2.0 / 3.0
+        ret += (160.0 * math.sin(y / 12.0 * pi) + 320 * math.sin(y * pi / 30.0)) * 2.0 / 3.0
+        return ret
+
+    def transform_lon(x, y):
+        ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+        ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
+        ret += (20.0 * math.sin(x * pi) + 40.0 * math.sin(x / 3.0 * pi)) * 2.0 / 3.0
+        ret += (150.0 * math.sin(x / 12.0 * pi) + 300.0 * math.sin(x / 30.0 * pi)) * 2.0 / 3.0
+        return ret
+
+    dlat = transform_lat(lng - 105.0, lat - 35.0)
+    dlng = transform_lon(lng - 105.0, lat - 35.0)
+    radlat = lat / 180.0 * pi
+    magic = math.sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = math.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * pi)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * math.cos(radlat) * pi)
+    mglat = lat + dlat
+    mglng = lng + dlng
+    return lng * 2 - mglng, lat * 2 - mglat
+
+
+def _ref_distance(lon1, lat1, lon2, lat2):
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _ref_turning_angle(p1, p2, p3):
+    cos_lat = math.cos(math.radians(p2[1]))
+    v1 = np.array([(p2[0] - p1[0]) * cos_lat, p2[1] - p1[1]])
+    v2 = np.array([(p3[0] - p2[0]) * cos_lat, p3[1] - p2[1]])
+    norm1 = np.linalg.norm(v1)
+    norm2 = np.linalg.norm(v2)
+    if norm1 == 0 or norm2 == 0:
+        return 180.0
+    cos_theta = np.dot(v1, v2) / (norm1 * norm2)
+    cos_theta = np.clip(cos_theta, -1.0, 1.0)
+    return 180.0 - math.degrees(math.acos(cos_theta))
+
+
+def reference_repair(df):
+    """
+    原始 auto_repair_trajectory 的修复循环（去掉文件读写）
+    返回 (排序去重后的 df, clean_lon, clean_lat, notes, debug 记录列表)
+    """
+    JUMP = run.JUMP_DETECT_THRESHOLD
+    SMOOTH = run.SMOOTH_THRESHOLD
+    MIN_IMP = run.MIN_IMPROVEMENT
+    AMBIGUOUS = run.AMBIGUOUS_THRESHOLD
+    GAIN = run.LOOKAHEAD_GAIN
+    SHARP_DEG = run.SHARP_TURN_DEG
+    SHARP_MULT = run.SHARP_GAIN_MULTIPLIER
+
+    df = df.sort_values(by='geoTime')
+    df = df.drop_duplicates(subset=['geoTime'], keep='first').reset_index(drop=True)
+    lons = df['longitude'].to_numpy()
+    lats = df['latitude'].to_numpy()
+    times = df['geoTime'].to_numpy()
+
+    fixed_lons = [lons[0]]
+    fixed_lats = [lats[0]]
+    notes = ["Start"]
+    debug_logs = []
+    prev_valid_lon = None
+    prev_valid_lat = None
+    last_valid_lon = lons[0]
+    last_valid_lat = lats[0]
+
+    for i in range(1, len(df)):
+        curr_raw_lon = lons[i]
+        curr_raw_lat = lats[i]
+        curr_fix_lon, curr_fix_lat = _ref_gcj02_to_wgs84(curr_raw_lon, curr_raw_lat)
+
+        dist_if_original = _ref_distance(last_valid_lon, last_valid_lat, curr_raw_lon, curr_raw_lat)
+        dist_if_fixed = _ref_distance(last_valid_lon, last_valid_lat, curr_fix_lon, curr_fix_lat)
+        improvement = dist_if_original - dist_if_fixed
+        cond_jump = dist_if_original > JUMP
+        cond_smooth = dist_if_fixed < SMOOTH
+        cond_improve = improvement > MIN_IMP
+
+        sharp_turn = False
+        angle_prev_raw = angle_prev_fix = angle_next_raw = angle_next_fix = None
+        required_improvement = MIN_IMP
+        if prev_valid_lon is not None:
+            angle_prev_raw = _ref_turning_angle(
+                (prev_valid_lon, prev_valid_lat), (last_valid_lon, last_valid_lat), (curr_raw_lon, curr_raw_lat))
+            angle_prev_fix = _ref_turning_angle(
+                (prev_valid_lon, prev_valid_lat), (last_valid_lon, last_valid_lat), (curr_fix_lon, curr_fix_lat))
+        if i + 2 < len(df):
+            angle_next_raw = _ref_turning_angle(
+                (curr_raw_lon, curr_raw_lat), (lons[i + 1], lats[i + 1]), (lons[i + 2], lats[i + 2]))
+            angle_next_fix = _ref_turning_angle(
+                (curr_fix_lon, curr_fix_lat), (lons[i + 1], lats[i + 1]), (lons[i + 2], lats[i + 2]))
+
+        angle_margin = 20.0
+        if angle_prev_fix is not None and angle_prev_fix < SHARP_DEG:
+            sharp_turn = True
+        if angle_next_fix is not None and angle_next_fix < SHARP_DEG:
+            sharp_turn = True
+        if angle_prev_fix is not None and angle_prev_fix + angle_margin < angle_prev_raw:
+            sharp_turn = True
+        if angle_next_fix is not None and angle_next_fix + angle_margin < angle_next_raw:
+            sharp_turn = True
+        if sharp_turn:
+            required_improvement = MIN_IMP * SHARP_MULT
+
+        lookahead_used = False
+        lookahead_decision = None
+        cost_raw = None
+        cost_fix = None
+        if cond_jump and cond_smooth:
+            if improvement >= required_improvement:
+                final_lon, final_lat = curr_fix_lon, curr_fix_lat
+                note, decision = "REPAIRED (GCJ->WGS)", "REPAIRED"
+            else:
+                final_lon, final_lat = curr_raw_lon, curr_raw_lat
+                note = "Original (SharpTurnBlocked)" if sharp_turn else "Original (InsufficientImprovement)"
+                decision = "BLOCKED_BY_ANGLE" if sharp_turn else "BLOCKED_BY_IMPROVEMENT"
+        elif abs(improvement) < AMBIGUOUS and i + 1 < len(df):
+            lookahead_used = True
+            next_raw_lon, next_raw_lat = lons[i + 1], lats[i + 1]
+            cost_raw = (_ref_distance(last_valid_lon, last_valid_lat, curr_raw_lon, curr_raw_lat)
+                        + _ref_distance(curr_raw_lon, curr_raw_lat, next_raw_lon, next_raw_lat))
+            cost_fix = (_ref_distance(last_valid_lon, last_valid_lat, curr_fix_lon, curr_fix_lat)
+                        + _ref_distance(curr_fix_lon, curr_fix_lat, next_raw_lon, next_raw_lat))
+            lookahead_threshold = GAIN
+            if sharp_turn:
+                lookahead_threshold *= SHARP_MULT
+            if cost_fix + lookahead_threshold < cost_raw:
+                final_lon, final_lat = curr_fix_lon, curr_fix_lat
+                note, decision, lookahead_decision = "REPAIRED (via LOOKAHEAD)", "LOOKAHEAD_FIX", "FIX"
+            else:
+                final_lon, final_lat = curr_raw_lon, curr_raw_lat
+                note, decision, lookahead_decision = "Original (via LOOKAHEAD)", "LOOKAHEAD_RAW", "RAW"
+        elif improvement <= -MIN_IMP:
+            final_lon, final_lat = curr_raw_lon, curr_raw_lat
+            note, decision = "Original", "ORIGINAL"
+        else:
+            final_lon, final_lat = curr_raw_lon, curr_raw_lat
+            note, decision = "Reset/Unsure", "RESET"
+
+        debug_logs.append({
+            "index": i, "geoTime": times[i],
+            "prev_lon": prev_valid_lon, "prev_lat": prev_valid_lat,
+            "last_lon": last_valid_lon, "last_lat": last_valid_lat,
+            "raw_lon": curr_raw_lon, "raw_lat": curr_raw_lat,
+            "fix_lon": curr_fix_lon, "fix_lat": curr_fix_lat,
+            "dist_if_original": dist_if_original, "dist_if_fixed": dist_if_fixed,
+            "improvement": improvement,
+            "cond_jump": cond_jump, "cond_smooth": cond_smooth, "cond_improve": cond_improve,
+            "angle_prev_raw": angle_prev_raw, "angle_prev_fix": angle_prev_fix,
+            "angle_next_raw": angle_next_raw, "angle_next_fix": angle_next_fix,
+            "sharp_turn": sharp_turn, "required_improvement": required_improvement,
+            "lookahead_used": lookahead_used, "lookahead_decision": lookahead_decision,
+            "cost_raw": cost_raw, "cost_fix": cost_fix,
+            "decision": decision, "note": note,
+        })
+        fixed_lons.append(final_lon)
+        fixed_lats.append(final_lat)
+        notes.append(note)
+        prev_valid_lon = last_valid_lon
+        prev_valid_lat = last_valid_lat
+        last_valid_lon = final_lon
+        last_valid_lat = final_lat
+
+    return df, fixed_lons, fixed_lats, notes, debug_logs
+
+
+# ---------------- 待校验的实现 ----------------
+@contextmanager
+def _run_settings(**values):
+    """临时修改 run.py 的配置"""
+    old = {name: getattr(run, name) for name in values}
+    for name, value in values.items():
+        setattr(run, name, value)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            setattr(run, name, value)
+
+
+def _collect(frames):
+    parts = []
+    logs = []
+    for part, part_logs in run.repair_frames(frames):
+        parts.append(part)
+        logs.extend(part_logs)
+    out = pd.concat(parts) if parts else pd.DataFrame(columns=['clean_longitude', 'clean_latitude', 'repair_note'])
+    return (out['clean_longitude'].tolist(), out['clean_latitude'].tolist(),
+            out['repair_note'].tolist(), logs)
+
+
+def engine_scalar(df):
+    """逐点，关闭驻留段压缩"""
+    with _run_settings(DWELL_COMPRESSION=False, GCJ02_INVERSE="fast"):
+        return _collect([run.prepare_frame(df)])
+
+
+def engine_dwell(df):
+    """驻留段压缩（run.py 默认配置）"""
+    with _run_settings(DWELL_COMPRESSION=True, GCJ02_INVERSE="fast"):
+        return _collect([run.prepare_frame(df)])
+
+
+def engine_chunked(df):
+    """按块流式修复（pipeline.py 的 INPUT_SORTED 路径），块大小按长度轮换"""
+    df = run.prepare_frame(df)
+    size = max(CHUNK_SIZES[len(df) % len(CHUNK_SIZES)], -(-len(df) // MAX_CHUNKS))
+    with _run_settings(DWELL_COMPRESSION=True, GCJ02_INVERSE="fast"):
+        return _collect(df.iloc[i:i + size] for i in range(0, len(df), size))
+
+
+def engine_exact_inverse(df):
+    """迭代逆变换（GCJ02_INVERSE = "exact"），备选坐标不同，预期会出现差异"""
+    with _run_settings(GCJ02_INVERSE="exact"):
+        return _collect([run.prepare_frame(df)])
+
+
+ENGINES = {
+    "scalar": engine_scalar,
+    "dwell": engine_dwell,
+    "chunked": engine_chunked,
+    "exact_inverse": engine_exact_inverse,
+}
+
+
+# ---------------- 测试数据 ----------------
+def fuzz_trajectory(rng, n):
+    """
+    随机轨迹：随机游走 + 部分点偏移为 GCJ-02 + 静止驻留段 + 大跳变 + 乱序 / 重复时间 + 少量 NaN
+    """
+    lon = rng.uniform(100.0, 122.0)
+    lat = rng.uniform(22.0, 40.0)
+    t = int(rng.integers(1.5e12, 1.8e12))
+    times, lons, lats = [], [], []
+    while len(times) < n:
+        if rng.random() < 0.05:
+            # 驻留段：坐标完全相同（可能整段都是 GCJ-02）
+            k = int(rng.integers(2, 60))
+            point = wgs84_to_gcj02(lon, lat) if rng.random() < 0.3 else (lon, lat)
+            for _ in range(k):
+                t += int(rng.integers(1, 10)) * 1000
+                times.append(t)
+                lons.append(point[0])
+                lats.append(point[1])
+            continue
+        scale = rng.choice([0.0, 1e-5, 3e-4, 3e-4, 1e-3, 3e-3, 1e-2, 5e-2])
+        lon += rng.uniform(-scale, scale)
+        lat += rng.uniform(-scale, scale)
+        t += int(rng.choice([0, 1000, 1000, 2000, 5000]))
+        point = wgs84_to_gcj02(lon, lat) if rng.random() < 0.2 else (lon, lat)
+        times.append(t)
+        lons.append(point[0] if rng.random() > 0.002 else np.nan)
+        lats.append(point[1])
+    df = pd.DataFrame({"geoTime": times[:n], "longitude": lons[:n], "latitude": lats[:n]})
+    df[["longitude", "latitude"]] = df[["longitude", "latitude"]].round(int(rng.choice([6, 8, 12])))
+    if rng.random() < 0.3:
+        df = df.sample(frac=1, random_state=int(rng.integers(1 << 31)))
+    return df
+
+
+def with_bad_times(rng, df, path):
+    """
+    把约 2% 的 geoTime 改为空值 / 非数字，写成 CSV 后用 ingest.read_export 读回，
+    覆盖真实导出中无效时间行的读取与剔除
+    """
+    times = df['geoTime'].astype(str).to_numpy(dtype=object)
+    bad = rng.random(len(times)) < 0.02
+    times[bad] = rng.choice(["", "n/a", "abc", "1742112000000x"], int(bad.sum()))
+    df.assign(geoTime=times).to_csv(path, index=False)
+    return read_export(path, REPAIR_COLUMNS)
+
+
+def build_cases(input_files=INPUT_FILES, fuzz_cases=FUZZ_CASES, seed=SEED):
+    """返回 [(名称, DataFrame)]"""
+    cases = []
+    for path in input_files:
+        if Path(path).exists():
+            cases.append((str(path), read_export(path, REPAIR_COLUMNS)))
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for k in range(fuzz_cases):
+            if rng.random() < FUZZ_SHORT_RATE:
+                n = int(rng.integers(1, 7))
+            else:
+                n = int(rng.integers(7, FUZZ_MAX_POINTS + 1))
+            name = f"fuzz-{seed}-{k}"
+            df = fuzz_trajectory(rng, n)
+            if rng.random() < FUZZ_BAD_TIME_RATE:
+                df = with_bad_times(rng, df, Path(tmp) / f"{name}.csv")
+            if len(df):     # 原始算法不处理空轨迹
+                cases.append((name, df))
+    return cases
+
+
+# ---------------- 对比 ----------------
+def _same_float(a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def first_divergence(expected, actual):
+    """
+    expected / actual: (clean_lon, clean_lat, notes, debug 记录)
+    返回第一个不一致的点 (index, 不一致的字段)，全部一致时返回 None
+    """
+    exp_lon, exp_lat, exp_notes, exp_logs = expected
+    act_lon, act_lat, act_notes, act_logs = actual
+    n = min(len(exp_notes), len(act_notes))
+    exp_decisions = ["START"] + [r["decision"] for r in exp_logs]
+    act_decisions = ["START"] + [r["decision"] for r in act_logs]
+    checks = {
+        "repair_note": np.asarray(exp_notes[:n], dtype=object) != np.asarray(act_notes[:n], dtype=object),
+        "decision": (np.asarray(exp_decisions[:n], dtype=object)
+                     != np.asarray((act_decisions + [None] * n)[:n], dtype=object)),
+        "clean_longitude": ~_same_float(exp_lon[:n], act_lon[:n]),
+        "clean_latitude": ~_same_float(exp_lat[:n], act_lat[:n]),
+    }
+    bad = np.zeros(n, dtype=bool)
+    for mismatch in checks.values():
+        bad |= mismatch
+    if bad.any():
+        i = int(np.argmax(bad))
+        return i, [name for name, mismatch in checks.items() if mismatch[i]]
+    if len(exp_notes) != len(act_notes):
+        return n, ["length"]
+    return None
+
+
+def _record(logs, index):
+    for record in logs:
+        if record["index"] == index:
+            return record
+    return None
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def check_engines(cases, engines=ENGINES_TO_TEST, fail_dir=FAIL_DIR):
+    """逐个用例对比，返回 {引擎: 汇总}"""
+    summary = {
+        name: {"cases": 0, "points": 0, "diverged": 0, "ref_s": 0.0, "engine_s": 0.0, "first": None}
+        for name in engines
+    }
+    for case_name, df in cases:
+        t0 = time.perf_counter()
+        prepared, *expected = reference_repair(df)
+        ref_seconds = time.perf_counter() - t0
+
+        for name in engines:
+            t0 = time.perf_counter()
+            actual = ENGINES[name](df)
+            seconds = time.perf_counter() - t0
+
+            s = summary[name]
+            s["cases"] += 1
+            s["points"] += len(prepared)
+            s["ref_s"] += ref_seconds
+            s["engine_s"] += seconds
+            diverged = first_divergence(expected, actual)
+            if diverged is None:
+                continue
+            s["diverged"] += 1
+            if s["first"] is None:
+                index, fields = diverged
+                saved = Path(fail_dir) / f"{name}_{Path(case_name).stem}.csv"
+                saved.parent.mkdir(parents=True, exist_ok=True)
+                df.to_csv(saved, index=False)
+                s["first"] = {
+                    "case": case_name,
+                    "index": index,
+                    "geoTime": prepared['geoTime'].iloc[index] if index < len(prepared) else None,
+                    "fields": fields,
+                    "reference": _record(expected[3], index),
+                    "engine": _record(actual[3], index),
+                    "input_saved": str(saved),
+                }
+    return summary
+
+
+def report(summary):
+    print(f"{'引擎':<16}{'用例':>6}{'点数':>10}{'不一致':>8}{'参考(s)':>10}{'引擎(s)':>10}{'加速比':>8}")
+    for name, s in summary.items():
+        speedup = s["ref_s"] / s["engine_s"] if s["engine_s"] else float('nan')
+        print(f"{name:<16}{s['cases']:>6}{s['points']:>10}{s['diverged']:>8}"
+              f"{s['ref_s']:>10.2f}{s['engine_s']:>10.2f}{speedup:>8.2f}x")
+
+    for name, s in summary.items():
+        first = s["first"]
+        if first is None:
+            continue
+        print("-" * 40)
+        print(f"[{name}] 第一个不一致: 用例 {first['case']}，index={first['index']}，"
+              f"geoTime={first['geoTime']}，字段 {', '.join(first['fields'])}")
+        print(f"输入已保存: {first['input_saved']}")
+        print("参考实现:", json.dumps(first["reference"], ensure_ascii=False, default=_json_default))
+        print("待测实现:", json.dumps(first["engine"], ensure_ascii=False, default=_json_default))
+
+
+def main():
+    cases = build_cases(INPUT_FILES, FUZZ_CASES, SEED)
+    print(f"共 {len(cases)} 条轨迹，对比引擎: {', '.join(ENGINES_TO_TEST)}")
+    summary = check_engines(cases, ENGINES_TO_TEST, FAIL_DIR)
+    report(summary)
+    if any(s["diverged"] for s in summary.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
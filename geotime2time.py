@@ -18,11 +18,17 @@ def geotime_to_custom_date(timestamp_ms, offset_hours):
     except Exception as e:
         return f"转换出错: {e}"
 
-# 运行转换
-result = geotime_to_custom_date(geo_time_input, TIMEZONE_OFFSET)
-
-print("-" * 30)
-print(f"输入 geoTime: {geo_time_input}")
-print(f"时区设置:     UTC+{TIMEZONE_OFFSET}")
-print(f"转换结果:     {result}")
-print("-" * 30)
\ No newline at end of file
+
+def main(geo_time=geo_time_input, offset_hours=TIMEZONE_OFFSET):
+    # 运行转换
+    result = geotime_to_custom_date(geo_time, offset_hours)
+
+    print("-" * 30)
+    print(f"输入 geoTime: {geo_time}")
+    print(f"时区设置:     UTC+{offset_hours}")
+    print(f"转换结果:     {result}")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+'''
+统一的 CSV 读取
+
+灵敢足迹导出（以及 run.py 输出）的字段类型在这里声明一次，各脚本只读取自己需要的列，
+并显式指定类型，避免 pandas 逐列推断类型、把用不到的列也解析一遍。
+安装了 pyarrow 时使用其多线程解析器，否则使用 pandas 自带的 C 解析器。
+'''
+import numpy as np
+import pandas as pd
+
+# ================= 配置 =================
+ENGINE = "auto"     # "auto"：有 pyarrow 就用 pyarrow，否则 "c"；也可直接指定 "pyarrow" / "c"
+# =======================================
+
+# 导出文件的字段类型；未列出的列仍由 pandas 推断
+# geoTime 不在此声明：个别行可能为空或不是数字，读取后由 drop_invalid_time 处理并转为 int64
+# 修复不用到的可选数值字段按原文读取（str）：写出时与输入逐字一致（40 不会变成 40.0），
+# 分块读取时每块类型也相同（推断类型时没有空值的块为整数、有空值的块为浮点数）
+EXPORT_SCHEMA = {
+    "longitude": "float64",
+    "latitude": "float64",
+    "altitude": "str",
+    "course": "str",
+    "horizontalAccuracy": "str",
+    "verticalAccuracy": "str",
+    "speed": "str",
+    "clean_longitude": "float64",
+    "clean_latitude": "float64",
+    "locationType": "category",
+}
+# 各脚本需要的列
+REPAIR_COLUMNS = ["geoTime", "longitude", "latitude"]
+PLOT_COLUMNS = ["geoTime", "longitude", "latitude", "clean_longitude", "clean_latitude"]
+
+_engine = None
+
+
+def parser_engine():
+    """实际使用的解析器（"pyarrow" 或 "c"）"""
+    global _engine
+    if ENGINE != "auto":
+        return ENGINE
+    if _engine is None:
+        try:
+            import pyarrow  # noqa: F401
+            _engine = "pyarrow"
+        except ImportError:
+            _engine = "c"
+    return _engine
+
+
+def read_header(path):
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _numeric_categories(df):
+    # C 解析器把类别解析为字符串，pyarrow 解析为可空整数；类别本身是数字时统一转为普通数字，
+    # 两种解析器结果一致，写回 CSV / JSON 时也与原来相同
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            categories = df[name].cat.categories
+            if isinstance(categories.dtype, np.dtype) and categories.dtype.kind in 'iuf':
+                continue
+            try:
+                numeric = pd.to_numeric(np.asarray(categories, dtype=object))
+            except (ValueError, TypeError):
+                continue
+            df[name] = df[name].cat.rename_categories(numeric)
+    return df
+
+
+def drop_invalid_time(df):
+    """
+    去掉 geoTime 为空或无法解析为数字的行（与原 cut 脚本跳过这些行一致），geoTime 转为 int64
+    """
+    if "geoTime" not in df.columns:
+        return df
+    t = df["geoTime"]
+    if isinstance(t.dtype, np.dtype) and t.dtype.kind in 'iu':
+        return df
+    t = pd.to_numeric(t, errors="coerce")
+    valid = np.isfinite(t.to_numpy(dtype=np.float64, na_value=np.nan))
+    if valid.all():
+        df = df.copy(deep=False)
+    else:
+        df = df[valid].copy()
+        t = t[valid]
+    df["geoTime"] = t.astype(np.int64)
+    return df
+
+
+def read_export(path, columns=None, chunksize=None, valid_time_only=True, **read_csv_kwargs):
+    """
+    按 EXPORT_SCHEMA 读取 CSV
+    columns: 只读取这些列（文件中没有的列忽略），None 为全部列
+    chunksize: 分块读取，返回迭代器（pyarrow 不支持分块，此时固定用 C 解析器）
+    valid_time_only: 去掉 geoTime 无效的行；为 False 时保留原始行（geoTime 可能不是整数类型），
+                     由调用方在合适的时候调用 drop_invalid_time
+    """
+    header = read_header(path)
+    usecols = header if columns is None else [c for c in header if c in columns]
+    dtype = {name: EXPORT_SCHEMA[name] for name in usecols if name in EXPORT_SCHEMA}
+    engine = "c" if chunksize else parser_engine()
+    if engine == "pyarrow" and any(dtype[name] == "str" for name in dtype):
+        # pyarrow 先按推断的类型解析，再转成字符串（"17" 会变成 "17.0"），需要按原文读取的列只能用 C 解析器
+        engine = "c"
+    if engine == "pyarrow" and "geoTime" in usecols:
+        # pyarrow 会把未声明类型、含空值的整数列强转为 int64 而报错，这里声明为可空整数
+        dtype["geoTime"] = "Int64"
+    try:
+        reader = pd.read_csv(
+            path,
+            usecols=usecols,
+            dtype=dtype,
+            engine=engine,
+            chunksize=chunksize,
+            **read_csv_kwargs,
+        )
+    except ValueError:
+        if dtype.get("geoTime") != "Int64":
+            raise
+        # geoTime 中有非数字内容：按字符串读取，由 drop_invalid_time 转换
+        dtype["geoTime"] = "str"
+        reader = pd.read_csv(path, usecols=usecols, dtype=dtype, engine=engine, **read_csv_kwargs)
+
+    def finish(df):
+        df = _numeric_categories(df)
+        return drop_invalid_time(df) if valid_time_only else df
+
+    if chunksize:
+        return (finish(chunk) for chunk in reader)
+    return finish(reader)
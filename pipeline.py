@@ -0,0 +1,222 @@
+'''
+一体化流式管线：截取 → 修复 → 转换 → 绘图数据
+
+输入文件只读一遍，按块依次经过 cut_gps_data.py 的截取、run.py 的修复、
+convert_csv.py 的格式转换，以及绘图所需列的收集。
+cut.csv / debug_decisions.csv 等中间文件只在打开对应开关时才写出。
+'''
+import time
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+
+import convert_csv
+import cut_gps_data
+import run
+from ingest import drop_invalid_time, read_export
+from profiling import get_profiler
+
+# ================= 配置 =================
+INPUT_FILE = './data/灵敢足迹（2025.12.22）.csv'
+OUTPUT_DIR = './output'
+CHUNK_SIZE = 200000         # 每块行数
+
+CUT = True                  # 是否应用 cut_gps_data.py 中的截取配置（MODE / 时间段 / 行号）
+# True : 输入已按 geoTime 升序，逐块流式修复，内存占用与文件大小无关
+# False: 截取后的数据在内存中排序去重（与 run.py 完全一致），再逐块修复
+INPUT_SORTED = False
+
+WRITE_CUT = False           # cut.csv
+WRITE_REPAIRED = True       # gps_data_perfect.csv
+WRITE_DEBUG = False         # debug_decisions.csv
+WRITE_CONVERTED = True      # gps_data_perfect_converted.csv
+STORE_DIR = None            # 轨迹库目录（store.py），设置后修复结果逐块追加进去
+PLOT = None                 # None / "folium" / "pydeck"
+# =======================================
+
+PLOT_COLUMNS = ['geoTime', 'latitude', 'longitude', 'clean_latitude', 'clean_longitude']
+
+
+class _CsvAppender:
+    """按块追加写 CSV，第一块写表头"""
+
+    def __init__(self, path, lineterminator='\n'):
+        self.path = path
+        self.lineterminator = lineterminator
+        self.started = False
+
+    def write(self, df, stage):
+        with get_profiler().stage(stage, points=len(df)):
+            self._write(df)
+
+    def _write(self, df):
+        df.to_csv(
+            self.path,
+            mode='a' if self.started else 'w',
+            header=not self.started,
+            index=False,
+            lineterminator=self.lineterminator,
+        )
+        self.started = True
+
+
+def _read_chunks(input_file, chunk_size, cut, cut_writer):
+    profiler = get_profiler()
+    offset = 0
+    # 行号模式按文件中的原始行计数，所以 geoTime 无效的行在截取之后再去掉
+    reader = read_export(input_file, chunksize=chunk_size, valid_time_only=False)
+    while True:
+        with profiler.stage('read_csv') as stage:
+            chunk = next(reader, None)
+            stage.points = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        n = len(chunk)
+        if cut:
+            chunk = cut_gps_data.cut_frame(chunk, offset)
+        offset += n
+        chunk = drop_invalid_time(chunk)
+        if cut_writer is not None:
+            cut_writer.write(chunk, 'write_cut')
+        yield chunk
+
+
+def _dedup_sorted(chunks):
+    """输入已有序：检查顺序，并去掉重复的 geoTime（保留第一条）"""
+    profiler = get_profiler()
+    last = None
+    for chunk in chunks:
+        with profiler.stage('sort_dedup', points=len(chunk)):
+            t = chunk['geoTime']
+            if not t.is_monotonic_increasing or (last is not None and len(t) and t.iloc[0] < last):
+                raise ValueError("输入未按 geoTime 升序排列，请设置 INPUT_SORTED = False")
+            keep = t.ne(t.shift())
+            if last is not None:
+                keep &= t.ne(last)
+            if len(t):
+                last = t.iloc[-1]
+            chunk = chunk[keep]
+        yield chunk
+
+
+def _sort_in_memory(chunks, chunk_size):
+    parts = list(chunks)
+    if not parts:
+        return
+    with get_profiler().stage('sort_dedup', points=sum(len(p) for p in parts)):
+        df = run.prepare_frame(pd.concat(parts))
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def run_pipeline(
+    input_file=INPUT_FILE,
+    output_dir=OUTPUT_DIR,
+    chunk_size=CHUNK_SIZE,
+    cut=CUT,
+    input_sorted=INPUT_SORTED,
+    write_cut=WRITE_CUT,
+    write_repaired=WRITE_REPAIRED,
+    write_debug=WRITE_DEBUG,
+    write_converted=WRITE_CONVERTED,
+    plot=PLOT,
+    store_dir=STORE_DIR,
+):
+    """执行整条管线，返回统计信息（点数、各 decision 计数、耗时、输出文件）"""
+    t0 = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    repaired_name = Path(run.OUTPUT_FILE).name
+    outputs = {}
+    if write_cut:
+        outputs['cut'] = output_dir / Path(cut_gps_data.output_csv).name
+    if write_repaired:
+        outputs['repaired'] = output_dir / repaired_name
+    if write_debug:
+        outputs['debug'] = output_dir / Path(run.DEBUG_FILE).name
+    if write_converted:
+        outputs['converted'] = output_dir / f"{Path(repaired_name).stem}{convert_csv.OUTPUT_SUFFIX}.csv"
+    writers = {name: _CsvAppender(path) for name, path in outputs.items()}
+    trajectory_store = None
+    if store_dir:
+        import store
+
+        trajectory_store = store.open_store(store_dir)
+    if 'converted' in writers:
+        # 与 convert_csv.py 的 csv.DictWriter 输出保持一致
+        writers['converted'].lineterminator = '\r\n'
+
+    chunks = _read_chunks(input_file, chunk_size, cut, writers.get('cut'))
+    if input_sorted:
+        frames = _dedup_sorted(chunks)
+    else:
+        frames = _sort_in_memory(chunks, chunk_size)
+
+    n_points = 0
+    decisions = Counter()
+    plot_parts = []
+    for part, logs in run.repair_frames(frames):
+        if not n_points:
+            decisions['START'] += 1  # 起点不进入 debug 日志
+        n_points += len(part)
+        decisions.update(record['decision'] for record in logs)
+
+        if 'repaired' in writers:
+            writers['repaired'].write(part, 'write_output')
+        if 'debug' in writers and logs:
+            writers['debug'].write(pd.DataFrame(logs), 'write_debug')
+        if 'converted' in writers:
+            writers['converted'].write(convert_csv.convert_frame(part), 'write_converted')
+        if trajectory_store is not None:
+            with get_profiler().stage('write_store', points=len(part)):
+                trajectory_store.append_frame(part)
+        if plot:
+            plot_parts.append(part[[c for c in PLOT_COLUMNS if c in part.columns]])
+
+    if plot and plot_parts:
+        plot_df = pd.concat(plot_parts)
+        if plot == 'folium':
+            import plot as plot_folium
+            outputs['html'] = output_dir / plot_folium.OUTPUT_HTML
+            plot_folium.render_before_after(plot_df, str(outputs['html']))
+        elif plot == 'pydeck':
+            import plot_pydeck
+            outputs['html'] = output_dir / plot_pydeck.OUTPUT_HTML
+            plot_pydeck.render_pydeck(plot_df, str(outputs['html']))
+        else:
+            raise ValueError("PLOT 只能是 None、'folium' 或 'pydeck'")
+
+    return {
+        "input": str(input_file),
+        "points": n_points,
+        "decisions": dict(decisions),
+        "seconds": time.perf_counter() - t0,
+        "outputs": {name: str(path) for name, path in outputs.items()},
+        # 轨迹库是共享目录，不放进 outputs（watch.py 会把 outputs 中的文件移动到各自的输出目录）
+        "store": str(store_dir) if store_dir else None,
+    }
+
+
+def main():
+    # 显式传入配置区的当前值（cli.py 可能已覆盖）
+    stats = run_pipeline(
+        INPUT_FILE, OUTPUT_DIR, CHUNK_SIZE, CUT, INPUT_SORTED,
+        WRITE_CUT, WRITE_REPAIRED, WRITE_DEBUG, WRITE_CONVERTED, PLOT, STORE_DIR,
+    )
+    print("-" * 30)
+    print(f"有效数据点: {stats['points']}")
+    print("决策统计:")
+    for decision, count in sorted(stats['decisions'].items(), key=lambda kv: -kv[1]):
+        print(f"  {decision:<24}{count}")
+    for name, path in stats['outputs'].items():
+        print(f"输出 {name}: {path}")
+    if stats['store']:
+        print(f"已追加到轨迹库: {stats['store']}")
+    print(f"耗时: {stats['seconds']:.2f}s")
+    print("-" * 30)
+
+
+if __name__ == '__main__':
+    main()
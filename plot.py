@@ -17,10 +17,16 @@ import pandas as pd
 import folium
 from folium.plugins import FastMarkerCluster, TimestampedGeoJson
 
+from ingest import PLOT_COLUMNS
+from profiling import get_profiler
+
 # ================= 配置 =================
 INPUT_FILE = './output/gps_data_perfect.csv'
 #INPUT_FILE = './output/gps_data_perfect.csv'
 OUTPUT_HTML = 'trajectory_before_after.html'
+# 只绘制该时间段（geoTime 毫秒，None 为不限）；输入为轨迹库目录时只读取这一段
+TIME_FROM = None
+TIME_TO = None
 # 画点配置（不抽稀）
 USE_POINT_MARKERS = False
 USE_FAST_MARKER_CLUSTER = False
@@ -76,8 +82,34 @@ def _build_time_features(df: pd.DataFrame, lat_col: str, lon_col: str, time_col:
 
 def visualize_before_after(file_path):
     print("正在读取数据...")
-    df = pd.read_csv(file_path, low_memory=False)
+    import store
+
+    with get_profiler().stage('read_csv'):
+        df = store.read_input(file_path, TIME_FROM, TIME_TO, columns=PLOT_COLUMNS + [TIME_COLUMN])
+    render_before_after(df, OUTPUT_HTML)
+
+
+def render_before_after(df: pd.DataFrame, output_html: str = OUTPUT_HTML) -> None:
+    profiler = get_profiler()
+    with profiler.stage('plot_prep', points=len(df)):
+        m, has_clean = _build_map(df)
+
+    # 保存
+    with profiler.stage('plot_render', points=len(df)):
+        m.save(output_html)
+
+    print("-" * 40)
+    print("对比可视化完成")
+    print(f"输出文件: {output_html}")
+    print("红色线  = 原始轨迹（坐标系混用）")
+    if has_clean:
+        print("蓝色线  = 修复后轨迹（统一 WGS-84）")
+    else:
+        print("（未检测到清洁数据列）")
+    print("-" * 40)
 
+
+def _build_map(df: pd.DataFrame):
     # 检查必需的列
     if 'latitude' not in df.columns or 'longitude' not in df.columns:
         raise ValueError("缺少列: latitude 或 longitude")
@@ -193,18 +225,7 @@ def visualize_before_after(file_path):
             icon=folium.Icon(color='red', icon='stop')
         ).add_to(m)
 
-    # 保存
-    m.save(OUTPUT_HTML)
-
-    print("-" * 40)
-    print("对比可视化完成")
-    print(f"输出文件: {OUTPUT_HTML}")
-    print("红色线  = 原始轨迹（坐标系混用）")
-    if has_clean:
-        print("蓝色线  = 修复后轨迹（统一 WGS-84）")
-    else:
-        print("（未检测到清洁数据列）")
-    print("-" * 40)
+    return m, has_clean
 
 
 if __name__ == '__main__':
@@ -7,6 +7,9 @@ from pathlib import Path
 
 import pandas as pd
 
+from ingest import PLOT_COLUMNS
+from profiling import get_profiler
+
 try:
     import pydeck as pdk
 except ImportError as exc:
@@ -21,6 +24,10 @@ OUTPUT_HTML = "trajectory_pydeck.html"
 DRAW_RAW_PATH = True
 DRAW_CLEAN_PATH = True
 DRAW_POINTS = False
+# Only draw this geoTime range (ms, None = unbounded). A store directory
+# (store.py) as INPUT_FILE reads just that slice.
+TIME_FROM = None
+TIME_TO = None
 
 # Map style: external free basemap (no token required).
 MAP_STYLE = "https://basemaps.cartocdn.com/gl/positron-gl-style/style.json"
@@ -28,8 +35,23 @@ MAP_STYLE = "https://basemaps.cartocdn.com/gl/positron-gl-style/style.json"
 
 
 def visualize_pydeck(file_path: str, output_html: str) -> None:
-    df = pd.read_csv(file_path, low_memory=False)
+    import store
+
+    with get_profiler().stage('read_csv'):
+        df = store.read_input(file_path, TIME_FROM, TIME_TO, columns=PLOT_COLUMNS)
+    render_pydeck(df, output_html)
+
+
+def render_pydeck(df: pd.DataFrame, output_html: str) -> None:
+    profiler = get_profiler()
+    with profiler.stage('plot_prep', points=len(df)):
+        deck = _build_deck(df)
+    with profiler.stage('plot_render', points=len(df)):
+        deck.to_html(output_html, title="GPS Trajectory (pydeck)")
+    print(f"Wrote {output_html}")
+
 
+def _build_deck(df: pd.DataFrame):
     has_clean = "clean_latitude" in df.columns and "clean_longitude" in df.columns
 
     df_raw = df.dropna(subset=["latitude", "longitude"])
@@ -94,7 +116,7 @@ def visualize_pydeck(file_path: str, output_html: str) -> None:
         pitch=0,
     )
 
-    deck = pdk.Deck(
+    return pdk.Deck(
         layers=layers,
         initial_view_state=view_state,
         map_style=MAP_STYLE,
@@ -102,9 +124,6 @@ def visualize_pydeck(file_path: str, output_html: str) -> None:
         controller={"doubleClickZoom": False},
     )
 
-    deck.to_html(output_html, title="GPS Trajectory (pydeck)")
-    print(f"Wrote {output_html}")
-
 
 if __name__ == "__main__":
     base_dir = Path(__file__).resolve().parent
@@ -0,0 +1,180 @@
+'''
+运行耗时统计
+
+各脚本在关键阶段调用 get_profiler().stage(...)，记录墙钟时间、CPU 时间、处理点数，
+以及决策计数等计数器；结束后输出一份 JSON 报告，便于长期对比。
+
+未启用时 get_profiler() 返回空实现，每个阶段只多一次方法调用。
+
+启用方式：
+  - python cli.py --profile report.json <子命令> ...
+  - 环境变量 GPS_PROFILE=report.json python run.py（任何脚本均可）
+'''
+import atexit
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'points', 'wall', 'cpu')
+
+    def __init__(self, profiler, name, points):
+        self.profiler = profiler
+        self.name = name
+        self.points = points
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(
+            self.name,
+            time.perf_counter() - self.wall,
+            time.process_time() - self.cpu,
+            self.points,
+        )
+        return False
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, name=''):
+        self.name = name
+        self.stages = {}
+        self.counters = Counter()
+        self.started = time.time()
+        self.wall0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+
+    def stage(self, name, points=0):
+        """
+        with profiler.stage('read_csv', points=n): ...
+        点数事先未知时可在块内设置：with profiler.stage('convert') as s: ...; s.points = n
+        """
+        return _Stage(self, name, points)
+
+    def add(self, name, wall, cpu=None, points=0, calls=1):
+        """直接累加一段已测得的耗时（逐点循环内部用 perf_counter 自行计时后汇总）"""
+        s = self.stages.get(name)
+        if s is None:
+            s = self.stages[name] = {"wall_s": 0.0, "cpu_s": None, "calls": 0, "points": 0}
+        s["wall_s"] += wall
+        if cpu is not None:
+            s["cpu_s"] = (s["cpu_s"] or 0.0) + cpu
+        s["calls"] += calls
+        s["points"] += points
+        s["peak_rss_mb"] = peak_rss_mb()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, report):
+        """
+        合并子进程的 report()（batch.py / watch.py 的任务在进程池中执行）
+        各阶段的耗时、点数和计数器累加；多个进程并行时，阶段耗时之和可能大于总墙钟时间
+        """
+        for name, s in report["stages"].items():
+            peak = self.stages.get(name, {}).get("peak_rss_mb")
+            self.add(name, s["wall_s"], s["cpu_s"], s["points"], s["calls"])
+            # 峰值内存取各进程中的最大值
+            peaks = [p for p in (peak, s.get("peak_rss_mb")) if p is not None]
+            self.stages[name]["peak_rss_mb"] = max(peaks) if peaks else None
+        self.counters.update(report["counters"])
+
+    def report(self):
+        stages = {}
+        for name, s in self.stages.items():
+            s = dict(s)
+            s["points_per_s"] = round(s["points"] / s["wall_s"], 1) if s["points"] and s["wall_s"] else None
+            stages[name] = s
+        return {
+            "run": self.name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "total_wall_s": time.perf_counter() - self.wall0,
+            "total_cpu_s": time.process_time() - self.cpu0,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        print(f"性能报告已保存: {path}")
+
+
+class _NullStage:
+    __slots__ = ('points',)  # 允许 "stage.points = n"，但不记录
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler:
+    """未启用时的空实现"""
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name, points=0):
+        return self._stage
+
+    def add(self, name, wall, cpu=None, points=0, calls=1):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def merge(self, report):
+        pass
+
+
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def enable(name=''):
+    global _profiler
+    _profiler = Profiler(name)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = NullProfiler()
+
+
+if os.environ.get('GPS_PROFILE'):
+    import multiprocessing
+
+    # 进程池的子进程也会导入本模块，只在主进程中启用，避免互相覆盖报告；
+    # 子进程中的耗时由 batch.py / watch.py 随任务结果带回主进程合并
+    if multiprocessing.parent_process() is None:
+        atexit.register(enable(os.path.basename(sys.argv[0])).write, os.environ['GPS_PROFILE'])
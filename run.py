@@ -4,11 +4,18 @@
 '''
 import pandas as pd
 import math
+import time
 import numpy as np
 
+from convert_csv import wgs84_to_gcj02_array
+from ingest import read_export
+from profiling import get_profiler
+
 # ---------------- 配置区域 ----------------
 INPUT_FILE = './data/灵敢足迹（2025.12.22）.csv'    # 乱序文件
 OUTPUT_FILE = './output/gps_data_perfect.csv' # 修复后的文件
+DEBUG_FILE = './output/debug_decisions.csv'   # 决策日志
+STORE_DIR = None                   # 轨迹库目录（store.py），设置后修复结果同时追加进去
 JUMP_DETECT_THRESHOLD = 50.0       # 下限：超过此值判定为异常跳变
 SMOOTH_THRESHOLD = 800.0            # 上限：修复后小于此值才视为物理合理
 MIN_IMPROVEMENT = 4.0              # 最小收益：修复必须改善至少 x m 才值得做
@@ -16,8 +23,40 @@ AMBIGUOUS_THRESHOLD = 120.0         # 不确定区间：|improvement| < 此值
 LOOKAHEAD_GAIN = 20.0              # 前瞻收益阈值：防止微小差异触发修复
 SHARP_TURN_DEG = 60.0              # 锐角阈值：小于此角度视为异常转向
 SHARP_GAIN_MULTIPLIER = 50        # 锐角时的修复门槛倍数
+DWELL_COMPRESSION = True           # 静止驻留段（坐标完全相同的连续点）只计算边界点，结果不变
+# GCJ-02 → WGS-84 逆变换精度（备选坐标）：
+#   "fast"  一步近似（原算法，误差可达 1m 以上）
+#   "iter"  固定迭代 GCJ02_ITERATIONS 次
+#   "exact" 逐点迭代到修正量 < GCJ02_TOLERANCE（度），最多 GCJ02_MAX_ITERATIONS 次
+GCJ02_INVERSE = "fast"
+GCJ02_ITERATIONS = 2
+GCJ02_TOLERANCE = 1e-9             # 约 0.1 mm
+GCJ02_MAX_ITERATIONS = 10
 # ----------------------------------------
 
+# 全部决策类型（debug 日志 decision 列；START 为起点，不写入 debug 日志）
+DECISIONS = (
+    "START",
+    "REPAIRED",
+    "BLOCKED_BY_ANGLE",
+    "BLOCKED_BY_IMPROVEMENT",
+    "LOOKAHEAD_FIX",
+    "LOOKAHEAD_RAW",
+    "ORIGINAL",
+    "RESET",
+)
+# 每种决策对应的 repair_note（一一对应）
+DECISION_NOTES = {
+    "START": "Start",
+    "REPAIRED": "REPAIRED (GCJ->WGS)",
+    "BLOCKED_BY_ANGLE": "Original (SharpTurnBlocked)",
+    "BLOCKED_BY_IMPROVEMENT": "Original (InsufficientImprovement)",
+    "LOOKAHEAD_FIX": "REPAIRED (via LOOKAHEAD)",
+    "LOOKAHEAD_RAW": "Original (via LOOKAHEAD)",
+    "ORIGINAL": "Original",
+    "RESET": "Reset/Unsure",
+}
+
 # --- 1. 基础算法：GCJ-02 转 WGS-84 (逆向纠偏) ---
 # 这是把"跑偏"的高德坐标拉回 GPS 坐标的公式
 def gcj02_to_wgs84(lng, lat):
@@ -58,6 +97,45 @@ def gcj02_to_wgs84(lng, lat):
     mglng = lng + dlng
     return lng * 2 - mglng, lat * 2 - mglat
 
+def gcj02_to_wgs84_array(lng, lat, mode=None, iterations=None, tolerance=None):
+    """
+    向量化逆变换：反复用正向变换 wgs84_to_gcj02 的残差修正，w <- w - (gcj(w) - g)
+    从 w = g 开始，第一次迭代即为 gcj02_to_wgs84 的一步近似
+    mode / iterations / tolerance 为 None 时使用配置区的 GCJ02_* 设置
+    输入可以是标量或任意形状的数组，返回相同形状（标量输入返回标量）
+    """
+    mode = mode or GCJ02_INVERSE
+    shape = np.shape(lng)
+    g_lng = np.asarray(lng, dtype=np.float64).ravel()
+    g_lat = np.asarray(lat, dtype=np.float64).ravel()
+    w_lng = g_lng.copy()
+    w_lat = g_lat.copy()
+
+    if mode == "fast":
+        steps, tolerance = 1, None
+    elif mode == "iter":
+        steps, tolerance = GCJ02_ITERATIONS if iterations is None else iterations, None
+    elif mode == "exact":
+        steps = GCJ02_MAX_ITERATIONS if iterations is None else iterations
+        tolerance = GCJ02_TOLERANCE if tolerance is None else tolerance
+    else:
+        raise ValueError(f"未知的逆变换模式: {mode}")
+
+    active = np.arange(len(g_lng))
+    for _ in range(steps):
+        f_lng, f_lat = wgs84_to_gcj02_array(w_lng[active], w_lat[active], china_only=False)
+        d_lng = f_lng - g_lng[active]
+        d_lat = f_lat - g_lat[active]
+        w_lng[active] -= d_lng
+        w_lat[active] -= d_lat
+        if tolerance is not None:
+            # 已收敛的点退出后续迭代（NaN 也在此退出）
+            active = active[(np.abs(d_lng) > tolerance) | (np.abs(d_lat) > tolerance)]
+            if not len(active):
+                break
+    # [()]：0 维数组取出标量，其余形状原样返回
+    return w_lng.reshape(shape)[()], w_lat.reshape(shape)[()]
+
 # --- 2. 距离计算工具 (Haversine) ---
 def get_distance(lon1, lat1, lon2, lat2):
     R = 6371000 # 地球半径
@@ -109,48 +187,61 @@ def turning_angle(p1, p2, p3):
     turning_deg = 180.0 - angle_math
     
     return turning_deg
-
 # --- 3. 核心修复逻辑 ---
-def auto_repair_trajectory(file_path, output_path):
-    print("读取数据...")
-    df = pd.read_csv(file_path)
-    
-    # 1. 预处理：按时间排序 + 暴力去重
-    df = df.sort_values(by='geoTime')
-    df = df.drop_duplicates(subset=['geoTime'], keep='first').reset_index(drop=True)
-    
-    print(f"有效数据点: {len(df)}")
-    
-    # 结果容器
-    fixed_lons = []
-    fixed_lats = []
-    notes = []
-    debug_logs = []
-    
-    # 初始化第一个点
-    prev_valid_lon = None  # 上上个输出点
-    prev_valid_lat = None
-    last_valid_lon = df.loc[0, 'longitude']
-    last_valid_lat = df.loc[0, 'latitude']
-    
-    fixed_lons.append(last_valid_lon)
-    fixed_lats.append(last_valid_lat)
-    notes.append("Start")
-    
-    print("正在进行平滑修复...")
-    
-    for i in range(1, len(df)):
-        # 当前点的"原始坐标"
-        curr_raw_lon = df.loc[i, 'longitude']
-        curr_raw_lat = df.loc[i, 'latitude']
-        
+class TrajectoryRepairer:
+    """
+    逐点修复状态机
+
+    每个点的决策只依赖：上一个 / 上上个输出点，当前点，以及后两个点的原始坐标。
+    因此可以对有序数据按块流式处理，只需在块之间保留最后两个点。
+    """
+
+    def __init__(self):
+        self.index = 0          # 下一个点在整条轨迹中的序号
+        self.prev_valid_lon = None  # 上上个输出点
+        self.prev_valid_lat = None
+        self.last_valid_lon = None
+        self.last_valid_lat = None
+        # 启用性能统计时，逐点累计各子阶段耗时（秒）
+        self.timing = False
+        self.times = {"conversion": 0.0, "angles": 0.0, "lookahead": 0.0}
+
+    def step(self, geo_time, curr_raw_lon, curr_raw_lat, next_raw=None, next_next_raw=None, curr_fix=None):
+        """
+        处理一个点，返回 (final_lon, final_lat, note, debug_record)
+        next_raw / next_next_raw: 后续点的原始 (lon, lat)，不存在时为 None
+        curr_fix: 预先（向量化）算好的备选坐标，None 时逐点用 gcj02_to_wgs84 计算
+        第一个点直接作为起点，debug_record 为 None
+        """
+        i = self.index
+        self.index += 1
+
+        # 初始化第一个点
+        if i == 0:
+            self.last_valid_lon = curr_raw_lon
+            self.last_valid_lat = curr_raw_lat
+            return curr_raw_lon, curr_raw_lat, "Start", None
+
+        prev_valid_lon = self.prev_valid_lon
+        prev_valid_lat = self.prev_valid_lat
+        last_valid_lon = self.last_valid_lon
+        last_valid_lat = self.last_valid_lat
+        timing = self.timing
+
         # 当前点的"备选坐标" (假设它是GCJ，转回WGS试试)
-        curr_fix_lon, curr_fix_lat = gcj02_to_wgs84(curr_raw_lon, curr_raw_lat)
-        
+        if curr_fix is not None:
+            curr_fix_lon, curr_fix_lat = curr_fix
+        else:
+            if timing:
+                t0 = time.perf_counter()
+            curr_fix_lon, curr_fix_lat = gcj02_to_wgs84(curr_raw_lon, curr_raw_lat)
+            if timing:
+                self.times["conversion"] += time.perf_counter() - t0
+
         # 计算两个假设与"上一个点"的距离
         dist_if_original = get_distance(last_valid_lon, last_valid_lat, curr_raw_lon, curr_raw_lat)
         dist_if_fixed = get_distance(last_valid_lon, last_valid_lat, curr_fix_lon, curr_fix_lat)
-        
+
         improvement = dist_if_original - dist_if_fixed
 
         cond_jump = dist_if_original > JUMP_DETECT_THRESHOLD
@@ -158,13 +249,15 @@ def auto_repair_trajectory(file_path, output_path):
         cond_improve = improvement > MIN_IMPROVEMENT
 
         # ---------- 角度检查（前向 + 后向）----------
+        if timing:
+            t0 = time.perf_counter()
         sharp_turn = False
         angle_prev_raw = None
         angle_prev_fix = None
         angle_next_raw = None
         angle_next_fix = None
         required_improvement = MIN_IMPROVEMENT
-        
+
         # 前向角度：a-b-c（角在 b，即 last_valid）
         if prev_valid_lon is not None:
             angle_prev_raw = turning_angle(
@@ -172,55 +265,55 @@ def auto_repair_trajectory(file_path, output_path):
                 (last_valid_lon, last_valid_lat),
                 (curr_raw_lon, curr_raw_lat)
             )
-            
+
             angle_prev_fix = turning_angle(
                 (prev_valid_lon, prev_valid_lat),
                 (last_valid_lon, last_valid_lat),
                 (curr_fix_lon, curr_fix_lat)
             )
-        
+
         # 后向角度：c-d-e（角在 d，即 i+1）
-        if i + 2 < len(df):
-            next_raw_lon = df.loc[i + 1, 'longitude']
-            next_raw_lat = df.loc[i + 1, 'latitude']
-            next_next_raw_lon = df.loc[i + 2, 'longitude']
-            next_next_raw_lat = df.loc[i + 2, 'latitude']
-            
+        if next_next_raw is not None:
+            next_raw_lon, next_raw_lat = next_raw
+            next_next_raw_lon, next_next_raw_lat = next_next_raw
+
             angle_next_raw = turning_angle(
                 (curr_raw_lon, curr_raw_lat),
                 (next_raw_lon, next_raw_lat),
                 (next_next_raw_lon, next_next_raw_lat)
             )
-            
+
             angle_next_fix = turning_angle(
                 (curr_fix_lon, curr_fix_lat),
                 (next_raw_lon, next_raw_lat),
                 (next_next_raw_lon, next_next_raw_lat)
             )
-        
+
         # 判定是否存在锐角或显著变差
         angle_margin = 20.0  # 允许的角度变化容差
-        
+
         if angle_prev_fix is not None and angle_prev_fix < SHARP_TURN_DEG:
             sharp_turn = True
         if angle_next_fix is not None and angle_next_fix < SHARP_TURN_DEG:
             sharp_turn = True
-        
+
         # 修复导致角度显著变差
         if angle_prev_fix is not None and angle_prev_fix + angle_margin < angle_prev_raw:
             sharp_turn = True
         if angle_next_fix is not None and angle_next_fix + angle_margin < angle_next_raw:
             sharp_turn = True
-        
+
         if sharp_turn:
             required_improvement = MIN_IMPROVEMENT * SHARP_GAIN_MULTIPLIER
+        if timing:
+            self.times["angles"] += time.perf_counter() - t0
 
         # ---------- 一阶强判 ----------
         lookahead_used = False
         lookahead_decision = None
         cost_raw = None
         cost_fix = None
-        
+
         # 条件 1：明显异常跳变且修复后合理 → 直接修
         if cond_jump and cond_smooth:
             if improvement >= required_improvement:
@@ -231,32 +324,33 @@ def auto_repair_trajectory(file_path, output_path):
                 final_lon, final_lat = curr_raw_lon, curr_raw_lat
                 note = "Original (SharpTurnBlocked)" if sharp_turn else "Original (InsufficientImprovement)"
                 decision = "BLOCKED_BY_ANGLE" if sharp_turn else "BLOCKED_BY_IMPROVEMENT"
-        
+
         # 条件 2：模糊区 → 启用第三点裁决（在否决之前！）
-        elif abs(improvement) < AMBIGUOUS_THRESHOLD and i + 1 < len(df):
+        elif abs(improvement) < AMBIGUOUS_THRESHOLD and next_raw is not None:
             lookahead_used = True
-            
+            if timing:
+                t0 = time.perf_counter()
+
             # 获取下一个点（原始坐标，不对它做修复）
-            next_raw_lon = df.loc[i + 1, 'longitude']
-            next_raw_lat = df.loc[i + 1, 'latitude']
-            
+            next_raw_lon, next_raw_lat = next_raw
+
             # 路径 A：不修 i
             cost_raw = (
                 get_distance(last_valid_lon, last_valid_lat, curr_raw_lon, curr_raw_lat)
                 + get_distance(curr_raw_lon, curr_raw_lat, next_raw_lon, next_raw_lat)
             )
-            
+
             # 路径 B：修 i
             cost_fix = (
                 get_distance(last_valid_lon, last_valid_lat, curr_fix_lon, curr_fix_lat)
                 + get_distance(curr_fix_lon, curr_fix_lat, next_raw_lon, next_raw_lat)
             )
-            
+
             # lookahead 也需考虑锐角惩罚
             lookahead_threshold = LOOKAHEAD_GAIN
             if sharp_turn:
                 lookahead_threshold *= SHARP_GAIN_MULTIPLIER
-            
+
             if cost_fix + lookahead_threshold < cost_raw:
                 final_lon, final_lat = curr_fix_lon, curr_fix_lat
                 note = "REPAIRED (via LOOKAHEAD)"
@@ -267,13 +361,15 @@ def auto_repair_trajectory(file_path, output_path):
                 note = "Original (via LOOKAHEAD)"
                 decision = "LOOKAHEAD_RAW"
                 lookahead_decision = "RAW"
-        
+            if timing:
+                self.times["lookahead"] += time.perf_counter() - t0
+
         # 条件 3：明显不该修 → 直接 ORIGINAL
         elif improvement <= -MIN_IMPROVEMENT:
             final_lon, final_lat = curr_raw_lon, curr_raw_lat
             note = "Original"
             decision = "ORIGINAL"
-        
+
         # 条件 4：兜底
         else:
             final_lon, final_lat = curr_raw_lon, curr_raw_lat
@@ -281,9 +377,9 @@ def auto_repair_trajectory(file_path, output_path):
             decision = "RESET"
 
         # --- 记录 debug 日志 ---
-        debug_logs.append({
+        record = {
             "index": i,
-            "geoTime": df.loc[i, "geoTime"],
+            "geoTime": geo_time,
             "prev_lon": prev_valid_lon,
             "prev_lat": prev_valid_lat,
             "last_lon": last_valid_lon,
@@ -310,35 +406,184 @@ def auto_repair_trajectory(file_path, output_path):
             "cost_fix": cost_fix,
             "decision": decision,
             "note": note
-        })
-        
-        # 更新结果
-        fixed_lons.append(final_lon)
-        fixed_lats.append(final_lat)
-        notes.append(note)
-        
+        }
+
         # 更新"上上个点"和"上一个有效点"
-        prev_valid_lon = last_valid_lon
-        prev_valid_lat = last_valid_lat
-        last_valid_lon = final_lon
-        last_valid_lat = final_lat
-        
-    df['clean_longitude'] = fixed_lons
-    df['clean_latitude'] = fixed_lats
-    df['repair_note'] = notes
-    
+        self.prev_valid_lon = last_valid_lon
+        self.prev_valid_lat = last_valid_lat
+        self.last_valid_lon = final_lon
+        self.last_valid_lat = final_lat
+
+        return final_lon, final_lat, note, record
+
+
+def _dwell_last(lons, lats):
+    """
+    驻留段预处理（游程编码）：坐标完全相同的连续点为一段 [a, b)
+    返回每个点所在段中最后一个"后两个点仍在段内"的下标 b - 3（段太短时小于该点下标）
+    """
+    n = len(lons)
+    if n < 3:
+        return np.full(n, -1, dtype=np.int64)
+    # 按位比较，-0.0 与 0.0 不算相同
+    lon_bits = np.ascontiguousarray(lons, dtype=np.float64).view(np.int64)
+    lat_bits = np.ascontiguousarray(lats, dtype=np.float64).view(np.int64)
+    same = (lon_bits[1:] == lon_bits[:-1]) & (lat_bits[1:] == lat_bits[:-1])
+    starts = np.flatnonzero(np.concatenate(([True], ~same)))
+    ends = np.append(starts[1:], n)
+    return np.repeat(ends - 3, ends - starts)
+
+
+def _repair_block(repairer, df, count, debug_logs):
+    """修复 df 的前 count 行；后续行（若有）只用作前瞻"""
+    profiler = get_profiler()
+    repairer.timing = profiler.enabled
+    start = len(debug_logs)
+
+    lons = df['longitude'].to_numpy()
+    lats = df['latitude'].to_numpy()
+    geo_times = df['geoTime'].to_numpy()
+    n = len(df)
+    dwell_last = _dwell_last(lons, lats) if DWELL_COMPRESSION else None
+
+    fixed_lons = []
+    fixed_lats = []
+    notes = []
+    reused = 0
+    with profiler.stage('repair', points=count):
+        fix_lons = fix_lats = None
+        if GCJ02_INVERSE != "fast":
+            # 迭代逆变换整块一次算完；"fast" 仍逐点调用 gcj02_to_wgs84，保证与原结果逐位一致
+            t0 = time.perf_counter()
+            fix_lons, fix_lats = gcj02_to_wgs84_array(lons[:count], lats[:count])
+            repairer.times["conversion"] += time.perf_counter() - t0
+
+        j = 0
+        while j < count:
+            next_raw = (lons[j + 1], lats[j + 1]) if j + 1 < n else None
+            next_next_raw = (lons[j + 2], lats[j + 2]) if j + 2 < n else None
+            curr_fix = (fix_lons[j], fix_lats[j]) if fix_lons is not None else None
+            final_lon, final_lat, note, record = repairer.step(
+                geo_times[j], lons[j], lats[j], next_raw, next_next_raw, curr_fix
+            )
+            fixed_lons.append(final_lon)
+            fixed_lats.append(final_lat)
+            notes.append(note)
+            if record is not None:
+                debug_logs.append(record)
+            j += 1
+
+            # 驻留段内：当前点与后两个点坐标相同，且上上个 / 上一个 / 本次输出点也相同时，
+            # 下一个点的全部输入与本点一致，决策必然相同，直接复用到段内后续各点
+            if (dwell_last is not None and record is not None and dwell_last[j - 1] >= j
+                    and record["prev_lon"] == record["last_lon"] == final_lon
+                    and record["prev_lat"] == record["last_lat"] == final_lat):
+                stop = min(int(dwell_last[j - 1]) + 1, count)
+                m = stop - j
+                fixed_lons.extend([final_lon] * m)
+                fixed_lats.extend([final_lat] * m)
+                notes.extend([note] * m)
+                base = repairer.index
+                for k in range(m):
+                    debug_logs.append(dict(record, index=base + k, geoTime=geo_times[j + k]))
+                repairer.index += m
+                reused += m
+                j = stop
+
+    if profiler.enabled:
+        # 子阶段只统计墙钟时间（逐点取 CPU 时间本身开销太大）
+        for name, seconds in repairer.times.items():
+            profiler.add(f'repair.{name}', seconds, points=count, calls=0)
+            repairer.times[name] = 0.0
+        if notes and notes[0] == "Start":
+            profiler.count('decision.START')
+        for record in debug_logs[start:]:
+            profiler.count(f"decision.{record['decision']}")
+        profiler.count('repair.dwell_reused', reused)
+
+    out = df.iloc[:count].copy()
+    out['clean_longitude'] = fixed_lons
+    out['clean_latitude'] = fixed_lats
+    out['repair_note'] = notes
+    return out
+
+
+def repair_frames(frames):
+    """
+    流式修复：frames 为按 geoTime 排序且已去重的 DataFrame 块序列
+    逐块产出 (带 clean_longitude / clean_latitude / repair_note 的块, 该块的 debug 日志)
+    每块末尾两行留到下一块一起处理，保证前瞻与整表处理完全一致
+    """
+    repairer = TrajectoryRepairer()
+    pending = None
+    for df in frames:
+        if pending is not None and len(pending):
+            df = pd.concat([pending, df])
+        ready = max(len(df) - 2, 0)
+        debug_logs = []
+        if ready:
+            yield _repair_block(repairer, df, ready, debug_logs), debug_logs
+        pending = df.iloc[ready:]
+
+    if pending is not None and len(pending):
+        debug_logs = []
+        yield _repair_block(repairer, pending, len(pending), debug_logs), debug_logs
+
+
+def prepare_frame(df):
+    # 预处理：按时间排序 + 暴力去重
+    df = df.sort_values(by='geoTime')
+    return df.drop_duplicates(subset=['geoTime'], keep='first').reset_index(drop=True)
+
+
+def repair_dataframe(df):
+    """整表修复，返回 (修复后的 df, debug 日志 DataFrame)"""
+    parts = []
+    debug_logs = []
+    for part, logs in repair_frames([df]):
+        parts.append(part)
+        debug_logs.extend(logs)
+    out = pd.concat(parts) if parts else df.assign(clean_longitude=[], clean_latitude=[], repair_note=[])
+    return out, pd.DataFrame(debug_logs)
+
+
+def auto_repair_trajectory(file_path, output_path, debug_path=DEBUG_FILE):
+    profiler = get_profiler()
+    print("读取数据...")
+    with profiler.stage('read_csv'):
+        df = read_export(file_path)
+
+    # 1. 预处理：按时间排序 + 暴力去重
+    with profiler.stage('sort_dedup', points=len(df)):
+        df = prepare_frame(df)
+
+    print(f"有效数据点: {len(df)}")
+
+    print("正在进行平滑修复...")
+    df, debug_df = repair_dataframe(df)
+
     print("-" * 30)
     print("修复统计:")
     print(df['repair_note'].value_counts())
     print("-" * 30)
-    
-    df.to_csv(output_path, index=False)
+
+    with profiler.stage('write_output', points=len(df)):
+        df.to_csv(output_path, index=False)
     print(f"完成! 请使用 clean_longitude 和 clean_latitude 绘图。")
-    
+
     # 导出 debug 日志
-    debug_df = pd.DataFrame(debug_logs)
-    debug_df.to_csv("./output/debug_decisions.csv", index=False)
-    print("Debug 日志已保存: ./output/debug_decisions.csv")
+    with profiler.stage('write_debug', points=len(debug_df)):
+        debug_df.to_csv(debug_path, index=False)
+    print(f"Debug 日志已保存: {debug_path}")
+
+    if STORE_DIR:
+        import store
+
+        with profiler.stage('write_store', points=len(df)):
+            appended = store.open_store(STORE_DIR).append_frame(df)
+        print(f"已追加 {appended} 行到轨迹库: {STORE_DIR}")
+    return df, debug_df
 
 
-auto_repair_trajectory(INPUT_FILE, OUTPUT_FILE)
\ No newline at end of file
+if __name__ == '__main__':
+    auto_repair_trajectory(INPUT_FILE, OUTPUT_FILE)
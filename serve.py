@@ -0,0 +1,368 @@
+'''
+本地轨迹查询服务
+
+修复结果只加载一次，建立时间索引 + 空间网格索引，
+浏览器页面（viewer.html）按 ?from=&to=&bbox= 按需拉取切片，
+不必为了换一天重新生成 HTML。
+
+接口:
+  GET /                 查看页面 (Leaflet)
+  GET /api/meta         数据范围、repair_note 编码表、二进制布局
+  GET /api/points       ?from=&to=&bbox=minLon,minLat,maxLon,maxLat&format=bin|geojson&limit=
+  GET /api/point        ?index= 或 ?geoTime=  单点完整字段 + debug 决策记录
+'''
+import json
+import math
+import time
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+# ================= 配置 =================
+INPUT_FILE = './output/gps_data_perfect.csv'   # 也可以是轨迹库目录（store.py）
+DEBUG_FILE = './output/debug_decisions.csv'   # 不存在时只返回行数据
+VIEWER_HTML = 'viewer.html'
+HOST = '127.0.0.1'
+PORT = 8765
+TIMEZONE_OFFSET = 2         # from/to 使用 "年-月-日 时:分:秒" 时的 UTC 偏移
+GRID_DEG = 0.01             # 空间网格边长（度），约 1km
+MAX_GRID_CELLS = 4096       # bbox 覆盖格子数超过此值时退化为时间切片 + 过滤
+MAX_POINTS = 200000         # 单次返回点数上限，超过则等间隔取点并在响应中标注 stride
+# =======================================
+
+BINARY_MAGIC = b'GTRJ'
+BINARY_VERSION = 1
+# 二进制切片布局（小端）：头部 + 按列排列的数组
+BINARY_HEADER = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('count', '<u4'),
+    ('stride', '<u4'),
+])
+BINARY_COLUMNS = [
+    ('index', '<u4'),
+    ('geoTime', '<i8'),
+    ('longitude', '<f8'),
+    ('latitude', '<f8'),
+    ('clean_longitude', '<f8'),
+    ('clean_latitude', '<f8'),
+    ('note_code', 'u1'),
+]
+
+
+def parse_time(value):
+    """geoTime 毫秒整数，或 '年-月-日 时:分:秒'（按 TIMEZONE_OFFSET 解释）"""
+    value = value.strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    tz = timezone(timedelta(hours=TIMEZONE_OFFSET))
+    dt = datetime.strptime(value.replace('T', ' '), "%Y-%m-%d %H:%M:%S")
+    return int(dt.replace(tzinfo=tz).timestamp() * 1000)
+
+
+def parse_bbox(value):
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox 格式: minLon,minLat,maxLon,maxLat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox 的最小值不能大于最大值")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _json_value(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return value
+
+
+class TrajectoryIndex:
+    """
+    内存中的轨迹索引
+
+    - 所有列按 geoTime 排序，时间查询为 searchsorted
+    - 空间网格：按 (格子, geoTime) 排序的下标数组，每个格子内部仍可按时间二分
+    """
+
+    def __init__(self, df, debug_df=None, grid_deg=GRID_DEG):
+        df = df.sort_values(by='geoTime', kind='stable').reset_index(drop=True)
+        has_clean = 'clean_longitude' in df.columns and 'clean_latitude' in df.columns
+
+        self.frame = df
+        self.grid_deg = grid_deg
+        self.geo_time = df['geoTime'].to_numpy(dtype=np.int64)
+        self.lon = df['longitude'].to_numpy(dtype=np.float64)
+        self.lat = df['latitude'].to_numpy(dtype=np.float64)
+        self.clean_lon = df['clean_longitude'].to_numpy(dtype=np.float64) if has_clean else self.lon
+        self.clean_lat = df['clean_latitude'].to_numpy(dtype=np.float64) if has_clean else self.lat
+
+        if 'repair_note' in df.columns:
+            notes = pd.Categorical(df['repair_note'].fillna(''))
+            self.note_codes = notes.codes.astype(np.uint8)
+            self.note_names = [str(c) for c in notes.categories]
+        else:
+            self.note_codes = np.zeros(len(df), dtype=np.uint8)
+            self.note_names = ['']
+
+        self.debug = {}
+        if debug_df is not None:
+            records = debug_df.to_dict(orient='records')
+            self.debug = {int(r['geoTime']): r for r in records}
+
+        self._build_grid()
+
+    def _build_grid(self):
+        valid = ~(np.isnan(self.clean_lon) | np.isnan(self.clean_lat))
+        rows = np.flatnonzero(valid)
+        cx = np.floor(self.clean_lon[rows] / self.grid_deg).astype(np.int64)
+        cy = np.floor(self.clean_lat[rows] / self.grid_deg).astype(np.int64)
+        # 行号本身已按时间排序，(cx, cy, 行号) 排序后格子内即为时间顺序
+        order = np.lexsort((rows, cy, cx))
+        self.grid_rows = rows[order]
+        self.grid_times = self.geo_time[self.grid_rows]
+        keys = np.stack([cx[order], cy[order]], axis=1)
+        if len(keys):
+            change = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+            starts = np.concatenate([[0], change])
+            ends = np.concatenate([change, [len(keys)]])
+        else:
+            starts = ends = np.empty(0, dtype=np.int64)
+        self.cells = {
+            (int(keys[s, 0]), int(keys[s, 1])): (int(s), int(e))
+            for s, e in zip(starts, ends)
+        }
+
+    def __len__(self):
+        return len(self.geo_time)
+
+    def time_range(self, t_from=None, t_to=None):
+        lo = 0 if t_from is None else int(np.searchsorted(self.geo_time, t_from, side='left'))
+        hi = len(self) if t_to is None else int(np.searchsorted(self.geo_time, t_to, side='right'))
+        return lo, max(lo, hi)
+
+    def query(self, t_from=None, t_to=None, bbox=None):
+        """返回满足条件的行号（升序，即时间顺序）"""
+        lo, hi = self.time_range(t_from, t_to)
+        if bbox is None or lo == hi:
+            return np.arange(lo, hi)
+
+        min_lon, min_lat, max_lon, max_lat = bbox
+        x0, x1 = math.floor(min_lon / self.grid_deg), math.floor(max_lon / self.grid_deg)
+        y0, y1 = math.floor(min_lat / self.grid_deg), math.floor(max_lat / self.grid_deg)
+        n_cells = (x1 - x0 + 1) * (y1 - y0 + 1)
+
+        if n_cells > MAX_GRID_CELLS or n_cells > hi - lo:
+            # 大范围或时间段很短：时间切片后直接过滤更快
+            rows = np.arange(lo, hi)
+        else:
+            t_lo, t_hi = self.geo_time[lo], self.geo_time[hi - 1]
+            parts = []
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    cell = self.cells.get((x, y))
+                    if cell is None:
+                        continue
+                    s, e = cell
+                    times = self.grid_times[s:e]
+                    a = s + int(np.searchsorted(times, t_lo, side='left'))
+                    b = s + int(np.searchsorted(times, t_hi, side='right'))
+                    if b > a:
+                        parts.append(self.grid_rows[a:b])
+            if not parts:
+                return np.empty(0, dtype=np.int64)
+            rows = np.sort(np.concatenate(parts))
+
+        lon = self.clean_lon[rows]
+        lat = self.clean_lat[rows]
+        mask = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        return rows[mask]
+
+    def lookup(self, index):
+        row = self.frame.iloc[index].to_dict()
+        record = {k: _json_value(v) for k, v in row.items()}
+        record['index'] = int(index)
+        debug = self.debug.get(int(self.geo_time[index]))
+        record['debug'] = None if debug is None else {k: _json_value(v) for k, v in debug.items()}
+        return record
+
+    def index_of_time(self, geo_time):
+        i = int(np.searchsorted(self.geo_time, geo_time, side='left'))
+        if i >= len(self) or self.geo_time[i] != geo_time:
+            raise KeyError(geo_time)
+        return i
+
+    def meta(self):
+        finite = ~(np.isnan(self.clean_lon) | np.isnan(self.clean_lat))
+        bbox = None
+        if finite.any():
+            bbox = [
+                float(self.clean_lon[finite].min()), float(self.clean_lat[finite].min()),
+                float(self.clean_lon[finite].max()), float(self.clean_lat[finite].max()),
+            ]
+        return {
+            "count": len(self),
+            "from": int(self.geo_time[0]) if len(self) else None,
+            "to": int(self.geo_time[-1]) if len(self) else None,
+            "bbox": bbox,
+            "notes": self.note_names,
+            "has_debug": bool(self.debug),
+            "binary": {
+                "magic": BINARY_MAGIC.decode(),
+                "version": BINARY_VERSION,
+                "header": [[name, BINARY_HEADER[name].str] for name in BINARY_HEADER.names],
+                "columns": BINARY_COLUMNS,
+            },
+        }
+
+    def encode_binary(self, rows, stride):
+        header = np.zeros(1, dtype=BINARY_HEADER)
+        header['magic'] = BINARY_MAGIC
+        header['version'] = BINARY_VERSION
+        header['count'] = len(rows)
+        header['stride'] = stride
+        columns = {
+            'index': rows,
+            'geoTime': self.geo_time[rows],
+            'longitude': self.lon[rows],
+            'latitude': self.lat[rows],
+            'clean_longitude': self.clean_lon[rows],
+            'clean_latitude': self.clean_lat[rows],
+            'note_code': self.note_codes[rows],
+        }
+        chunks = [header.tobytes()]
+        chunks.extend(np.ascontiguousarray(columns[name], dtype=dt).tobytes() for name, dt in BINARY_COLUMNS)
+        return b''.join(chunks)
+
+    def encode_geojson(self, rows, stride):
+        def line(lon, lat, name):
+            # 去掉坐标为 NaN 的点，返回保留下来的行号，逐点属性按同样的行号取
+            coords = np.stack([lon[rows], lat[rows]], axis=1)
+            valid = ~np.isnan(coords).any(axis=1)
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coords[valid].tolist()},
+                "properties": {"name": name},
+            }
+            return feature, rows[valid]
+
+        clean, clean_rows = line(self.clean_lon, self.clean_lat, "clean")
+        clean["properties"].update({
+            "index": clean_rows.tolist(),
+            "geoTime": self.geo_time[clean_rows].tolist(),
+            "note_code": self.note_codes[clean_rows].tolist(),
+        })
+        body = {
+            "type": "FeatureCollection",
+            "features": [line(self.lon, self.lat, "raw")[0], clean],
+            "properties": {"count": len(rows), "stride": stride, "notes": self.note_names},
+        }
+        return json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+
+def load_index(input_file=INPUT_FILE, debug_file=DEBUG_FILE):
+    import store
+
+    df = store.read_input(input_file)
+    debug_df = None
+    if debug_file and Path(debug_file).exists():
+        debug_df = pd.read_csv(debug_file, low_memory=False)
+    return TrajectoryIndex(df, debug_df)
+
+
+class TrajectoryHandler(BaseHTTPRequestHandler):
+    index = None
+    viewer_path = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            if url.path in ('/', '/index.html'):
+                self._send(200, self.viewer_path.read_bytes(), 'text/html; charset=utf-8')
+            elif url.path == '/api/meta':
+                self._send_json(200, self.index.meta())
+            elif url.path == '/api/points':
+                self._points(params, start)
+            elif url.path == '/api/point':
+                self._point(params)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (ValueError, KeyError, IndexError) as exc:
+            self._send_json(400, {"error": f"{type(exc).__name__}: {exc}"})
+
+    def _points(self, params, start):
+        t_from = parse_time(params['from']) if params.get('from') else None
+        t_to = parse_time(params['to']) if params.get('to') else None
+        bbox = parse_bbox(params['bbox']) if params.get('bbox') else None
+        limit = int(params.get('limit', MAX_POINTS))
+        rows = self.index.query(t_from, t_to, bbox)
+        stride = max(1, math.ceil(len(rows) / limit)) if limit > 0 else 1
+        if stride > 1:
+            rows = rows[::stride]
+        if params.get('format', 'bin') == 'geojson':
+            body, content_type = self.index.encode_geojson(rows, stride), 'application/geo+json'
+        else:
+            body, content_type = self.index.encode_binary(rows, stride), 'application/octet-stream'
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._send(200, body, content_type, {
+            'X-Point-Count': str(len(rows)),
+            'X-Stride': str(stride),
+            'X-Query-Ms': f"{elapsed_ms:.2f}",
+        })
+
+    def _point(self, params):
+        if 'index' in params:
+            i = int(params['index'])
+            if not 0 <= i < len(self.index):
+                raise IndexError(i)
+        else:
+            i = self.index.index_of_time(int(params['geoTime']))
+        self._send_json(200, self.index.lookup(i))
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(input_file=INPUT_FILE, debug_file=DEBUG_FILE, host=HOST, port=PORT):
+    base_dir = Path(__file__).resolve().parent
+    print("正在加载数据...")
+    t0 = time.perf_counter()
+    TrajectoryHandler.index = load_index(input_file, debug_file)
+    TrajectoryHandler.viewer_path = base_dir / VIEWER_HTML
+    print(f"已加载 {len(TrajectoryHandler.index)} 个点，用时 {time.perf_counter() - t0:.2f}s")
+
+    server = ThreadingHTTPServer((host, port), TrajectoryHandler)
+    print(f"查看页面: http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,278 @@
+'''
+追加式列存轨迹库
+
+修复结果按列存成定长二进制文件，读取时 np.memmap 映射，按时间段取切片不需要解析文本。
+
+目录结构:
+  meta.json            列定义、已提交行数、决策编码表、稀疏索引步长
+  geoTime.i8           int64，严格递增
+  longitude.f8         原始坐标
+  latitude.f8
+  clean_longitude.f8   修复后坐标
+  clean_latitude.f8
+  decision.u1          决策编码（meta.json 中 decisions 的下标）
+  <附加列>.<类型>       创建时声明，如 altitude.f8；整数附加列用 -1 表示缺失，浮点输入四舍五入
+  index.i8             稀疏时间索引：第 0、S、2S ... 行的 geoTime
+
+追加流程：先截掉上次未提交的残留数据，追加各列，最后原子替换 meta.json。
+读取方只相信 meta.json 中的行数，写入中途崩溃不会读到半行。
+'''
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# ================= 配置 =================
+INDEX_STRIDE = 4096         # 稀疏索引步长（行）
+# 新建库时默认保存的附加列（convert_csv.py 需要的字段）
+EXTRA_COLUMNS = {
+    "altitude": "f8",
+    "course": "f8",             # 无效航向在导出中为 -1，不能用 -1 表示缺失的整数列保存
+    "horizontalAccuracy": "f8",
+    "speed": "f8",
+    "locationType": "i2",
+}
+# =======================================
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.i8'
+CORE_COLUMNS = {
+    "geoTime": "i8",
+    "longitude": "f8",
+    "latitude": "f8",
+    "clean_longitude": "f8",
+    "clean_latitude": "f8",
+    "decision": "u1",
+}
+MISSING_INT = -1
+
+
+def is_store(path):
+    return (Path(path) / META_FILE).is_file()
+
+
+class TrajectoryStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = dict(self.meta['columns'])
+        self.rows = self.meta['rows']
+        self.decisions = self.meta['decisions']
+        self.decision_notes = self.meta['decision_notes']
+        self._maps = {}
+        self._index = None
+
+    @classmethod
+    def create(cls, path, extra_columns=None):
+        from run import DECISION_NOTES, DECISIONS
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        columns = dict(CORE_COLUMNS)
+        columns.update(EXTRA_COLUMNS if extra_columns is None else extra_columns)
+        meta = {
+            "version": 1,
+            "rows": 0,
+            "index_stride": INDEX_STRIDE,
+            "columns": columns,
+            "decisions": list(DECISIONS),
+            "decision_notes": [DECISION_NOTES[d] for d in DECISIONS],
+        }
+        for name, dtype in columns.items():
+            (path / f"{name}.{dtype}").touch()
+        (path / INDEX_FILE).touch()
+        _write_meta(path, meta)
+        return cls(path)
+
+    def __len__(self):
+        return self.rows
+
+    def _file(self, name):
+        return self.path / f"{name}.{self.columns[name]}"
+
+    # ---------- 读取 ----------
+    def column(self, name):
+        """整列的只读内存映射（不拷贝）"""
+        if name not in self._maps:
+            dtype = np.dtype('<' + self.columns[name])
+            if self.rows == 0:
+                self._maps[name] = np.empty(0, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(self._file(name), dtype=dtype, mode='r', shape=(self.rows,))
+        return self._maps[name]
+
+    def _sparse_index(self):
+        if self._index is None:
+            n = -(-self.rows // self.meta['index_stride'])
+            self._index = np.fromfile(self.path / INDEX_FILE, dtype='<i8', count=n) if n else np.empty(0, '<i8')
+        return self._index
+
+    def time_slice(self, t_from=None, t_to=None):
+        """geoTime 在 [t_from, t_to] 内的行号范围 (start, stop)"""
+        times = self.column('geoTime')
+        index = self._sparse_index()
+        stride = self.meta['index_stride']
+
+        def locate(t, side):
+            # 先在稀疏索引里定位块，再只在该块内二分，只会触及少量页面
+            block = int(np.searchsorted(index, t, side=side)) - 1
+            lo = max(block, 0) * stride
+            hi = min(lo + stride, self.rows) if block >= 0 else 0
+            return lo + int(np.searchsorted(times[lo:hi], t, side=side))
+
+        start = 0 if t_from is None else locate(t_from, 'left')
+        stop = self.rows if t_to is None else locate(t_to, 'right')
+        return start, max(start, stop)
+
+    def read(self, t_from=None, t_to=None, columns=None):
+        """按时间段返回 {列名: 内存映射切片}，不拷贝数据"""
+        start, stop = self.time_slice(t_from, t_to)
+        names = columns or list(self.columns)
+        return {name: self.column(name)[start:stop] for name in names}
+
+    def to_frame(self, t_from=None, t_to=None, columns=None):
+        """
+        按时间段读出 DataFrame，decision 还原为决策名，并补回 repair_note
+        整数附加列中的 -1 还原为缺失值
+        其余列直接引用内存映射切片（只读），不拷贝；decision 与整数附加列需要解码，会生成新数组
+        """
+        import pandas as pd
+
+        data = self.read(t_from, t_to, columns)
+        frame = {}
+        for name, values in data.items():
+            if name == 'decision':
+                codes = np.asarray(values)
+                frame['repair_note'] = np.asarray(self.decision_notes, dtype=object)[codes]
+                frame['decision'] = np.asarray(self.decisions, dtype=object)[codes]
+            elif self.columns[name].startswith('i') and name != 'geoTime':
+                frame[name] = pd.array(np.asarray(values), dtype='Int64')
+                frame[name][np.asarray(values) == MISSING_INT] = pd.NA
+            else:
+                frame[name] = np.asarray(values)
+        # copy=False：各列保持独立，不合并成二维块（合并会整体拷贝）
+        return pd.DataFrame(frame, copy=False)
+
+    # ---------- 追加 ----------
+    def append(self, data):
+        """
+        追加若干行，data 为 {列名: 数组}；geoTime 必须严格递增
+        已存在的时间（<= 库中最后一个 geoTime）会被跳过，返回实际追加的行数
+        """
+        times = np.asarray(data['geoTime'], dtype='<i8')
+        if len(times) and np.any(np.diff(times) <= 0):
+            raise ValueError("追加数据的 geoTime 必须严格递增")
+        if self.rows:
+            keep = times > self.column('geoTime')[-1]
+            if not keep.all():
+                times = times[keep]
+                data = {k: np.asarray(v)[keep] for k, v in data.items()}
+        n = len(times)
+        if n == 0:
+            return 0
+
+        self._maps.clear()
+        stride = self.meta['index_stride']
+        for name, dtype in self.columns.items():
+            path = self._file(name)
+            values = data.get(name)
+            if values is None:
+                values = np.full(n, MISSING_INT if dtype[0] in 'iu' else np.nan)
+            values = np.asarray(values)
+            if dtype[0] == 'i' and values.dtype.kind == 'f':
+                values = np.where(np.isnan(values), MISSING_INT, np.rint(values))
+            _append_array(path, np.ascontiguousarray(values, dtype=np.dtype('<' + dtype)), self.rows)
+
+        # 新行中落在步长整数倍上的行进入稀疏索引
+        first = -(-self.rows // stride) * stride
+        marks = np.arange(first, self.rows + n, stride) - self.rows
+        _append_array(self.path / INDEX_FILE, times[marks], -(-self.rows // stride))
+        self._index = None
+
+        self.rows += n
+        self.meta['rows'] = self.rows
+        _write_meta(self.path, self.meta)
+        return n
+
+    def append_frame(self, df):
+        """追加 run.py 的修复结果（按 repair_note 编码决策）"""
+        note_codes = {note: code for code, note in enumerate(self.decision_notes)}
+        import pandas as pd
+
+        data = {
+            name: df[name].to_numpy()
+            for name in self.columns
+            if name in df.columns and name != 'decision'
+        }
+        data['decision'] = df['repair_note'].map(note_codes).to_numpy(dtype=np.uint8)
+        for name in self.columns:
+            if name in data and name not in CORE_COLUMNS:
+                # 附加列由 ingest 按原文（字符串）读入，这里转为数值，无法解析的记为缺失
+                data[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        return self.append(data)
+
+
+def _append_array(path, values, committed_items):
+    """先截掉上次未提交的残留，再追加"""
+    itemsize = values.dtype.itemsize
+    with open(path, 'r+b') as f:
+        f.truncate(committed_items * itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(values.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_meta(path, meta):
+    fd, tmp = tempfile.mkstemp(dir=path, prefix='.meta.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path / META_FILE)
+
+
+def extras_as_text(df):
+    """
+    浮点附加列（altitude、course 等）转为导出中的文本写法：整数值不带 .0（40.0 → "40"），缺失为空
+    用于把库中的数据写回 CSV，使输出与直接处理 CSV 时一致
+    """
+    for name in df.columns:
+        if name not in CORE_COLUMNS and df[name].dtype.kind == 'f':
+            values = df[name]
+            text = values.astype(str).str.replace(r'\.0$', '', regex=True)
+            df[name] = text.where(values.notna(), '')
+    return df
+
+
+def open_store(path, extra_columns=None):
+    """打开轨迹库，不存在时新建"""
+    if is_store(path):
+        return TrajectoryStore(path)
+    return TrajectoryStore.create(path, extra_columns)
+
+
+def read_input(path, t_from=None, t_to=None, columns=None, **read_csv_kwargs):
+    """
+    下游脚本的统一读取入口：path 是轨迹库目录时读时间段切片，否则按 ingest.py 的字段类型读 CSV
+    t_from / t_to 为 geoTime（毫秒），对 CSV 输入同样生效
+    columns: 只读取这些列（不存在的列忽略）
+    """
+    if is_store(path):
+        trajectory_store = TrajectoryStore(path)
+        if columns is not None:
+            columns = [c for c in trajectory_store.columns if c in columns]
+        return trajectory_store.to_frame(t_from, t_to, columns)
+
+    from ingest import read_export
+
+    df = read_export(path, columns, **read_csv_kwargs)
+    if t_from is not None:
+        df = df[df['geoTime'] >= t_from]
+    if t_to is not None:
+        df = df[df['geoTime'] <= t_to]
+    return df
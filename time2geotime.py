@@ -7,12 +7,12 @@ target_time = "2022-04-16 03:22:00"
 TIMEZONE_OFFSET = 2
 # ================================================
 
-def time_to_geotime(time_str):
+def time_to_geotime(time_str, offset_hours=TIMEZONE_OFFSET):
     # 1. 设置格式
     time_format = "%Y-%m-%d %H:%M:%S"
     
     # 2. 定义目标时区 (UTC+2)
-    target_tz = timezone(timedelta(hours=TIMEZONE_OFFSET))
+    target_tz = timezone(timedelta(hours=offset_hours))
     
     # 3. 解析时间字符串
     try:
@@ -28,11 +28,17 @@ def time_to_geotime(time_str):
     except ValueError:
         return "格式错误，请检查是否为 '年-月-日 时:分:秒' 格式"
 
-# 运行转换
-result = time_to_geotime(target_time)
 
-print("-" * 30)
-print(f"输入时间: {target_time}")
-print(f"时区设定: UTC+{TIMEZONE_OFFSET}")
-print(f"转换结果: {result}")
-print("-" * 30)
\ No newline at end of file
+def main(time_str=target_time, offset_hours=TIMEZONE_OFFSET):
+    # 运行转换
+    result = time_to_geotime(time_str, offset_hours)
+
+    print("-" * 30)
+    print(f"输入时间: {time_str}")
+    print(f"时区设定: UTC+{offset_hours}")
+    print(f"转换结果: {result}")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+'''
+监视目录守护进程
+
+定时扫描 WATCH_DIR，文件大小和修改时间持续 STABLE_SECONDS 不变才视为写完，
+随后放入队列，由固定大小的进程池执行 pipeline.py 的修复 + 转换。
+输出先写到临时目录，再逐个 os.replace 到 OUTPUT_DIR/<文件名>/，不会留下半截文件。
+
+运行状态（队列长度、单个任务耗时、吞吐、到达速率）定期写入 STATUS_FILE，
+用于判断 MAX_WORKERS 是否跟得上新文件的到达速度。
+'''
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from profiling import get_profiler
+
+# ================= 配置 =================
+WATCH_DIR = './data'
+OUTPUT_DIR = './output'
+PATTERN = '*.csv'
+POLL_SECONDS = 2.0          # 扫描间隔
+STABLE_SECONDS = 5.0        # 大小 / 修改时间持续不变多久才视为写完
+MAX_WORKERS = 2             # 进程池大小（同时修复的文件数）
+JOB_RETRIES = 1             # 子进程被杀死（如内存耗尽）导致进程池损坏时，任务重新排队的次数
+CUT = False                 # 是否对新文件应用 cut_gps_data.py 的截取配置
+WRITE_DEBUG = True          # 是否写出 debug_decisions.csv
+STATUS_FILE = './output/watch_status.json'
+STATUS_SECONDS = 10.0       # 状态写出间隔
+RECENT_JOBS = 50            # 状态中保留最近多少个任务
+# =======================================
+
+
+def _atomic_write_text(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def repair_job(input_path, output_dir, cut=CUT, write_debug=WRITE_DEBUG, profile=False):
+    """
+    在子进程中运行：修复一个文件，输出到 output_dir/<文件名>/
+    profile=True 时在子进程中统计各阶段耗时，报告放在返回值的 'profile' 中，由主进程合并
+    """
+    import pipeline
+    import profiling
+
+    input_path = Path(input_path)
+    profiler = profiling.enable(input_path.name) if profile else None
+    target_dir = Path(output_dir) / input_path.stem
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=target_dir.parent, prefix=f".{input_path.stem}."))
+    try:
+        stats = pipeline.run_pipeline(
+            input_file=str(input_path),
+            output_dir=str(tmp_dir),
+            cut=cut,
+            write_cut=False,
+            write_debug=write_debug,
+            plot=None,
+            # 多个子进程同时追加同一个轨迹库没有加锁，这里固定不写轨迹库（不受 pipeline.STORE_DIR 影响）
+            store_dir=None,
+        )
+        target_dir.mkdir(parents=True, exist_ok=True)
+        outputs = {}
+        for name, tmp_path in stats['outputs'].items():
+            final_path = target_dir / Path(tmp_path).name
+            os.replace(tmp_path, final_path)
+            outputs[name] = str(final_path)
+        stats['outputs'] = outputs
+        if profiler is not None:
+            stats['profile'] = profiler.report()
+        return stats
+    finally:
+        if profiler is not None:
+            profiling.disable()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class WatchDaemon:
+    def __init__(self, watch_dir=WATCH_DIR, output_dir=OUTPUT_DIR, max_workers=MAX_WORKERS):
+        self.watch_dir = Path(watch_dir)
+        self.output_dir = Path(output_dir)
+        self.max_workers = max_workers
+        self.queue = asyncio.Queue()
+        self.pool = None
+        self.stop_event = asyncio.Event()
+
+        self.pending = {}       # path -> (size, mtime_ns, 首次观察到该状态的时间)
+        self.done = {}          # path -> (size, mtime_ns) 已处理（或已入队）的版本
+        self.in_flight = 0
+        self.started_at = time.time()
+        self.arrived = 0
+        self.completed = 0
+        self.failed = 0
+        self.points = 0
+        self.busy_seconds = 0.0
+        self.recent = deque(maxlen=RECENT_JOBS)
+
+    # ---------- 发现新文件 ----------
+    def _already_repaired(self, path, stat):
+        output = self.output_dir / path.stem / 'gps_data_perfect.csv'
+        return output.exists() and output.stat().st_mtime_ns >= stat.st_mtime_ns
+
+    def scan(self):
+        now = time.monotonic()
+        for path in sorted(self.watch_dir.glob(PATTERN)):
+            if path.name.startswith(('.', '~')) or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            version = (stat.st_size, stat.st_mtime_ns)
+            if self.done.get(path) == version:
+                continue
+
+            seen = self.pending.get(path)
+            if seen is None or seen[:2] != version:
+                # 新文件或仍在写入：重新计时
+                self.pending[path] = (*version, now)
+                continue
+            if now - seen[2] < STABLE_SECONDS:
+                continue
+
+            del self.pending[path]
+            self.done[path] = version
+            if self._already_repaired(path, stat):
+                continue
+            self.arrived += 1
+            self.queue.put_nowait((path, time.monotonic(), 0))
+            print(f"[watch] 新文件: {path.name}（队列 {self.queue.qsize()}）")
+
+    async def scanner(self):
+        while not self.stop_event.is_set():
+            self.scan()
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- 执行任务 ----------
+    def _replace_pool(self, broken):
+        """进程池中有子进程异常退出后，整个池不能再用，换一个新的（多个 worker 同时发现时只换一次）"""
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            print("[watch] 进程池已损坏，已重建")
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        profiler = get_profiler()
+        while True:
+            path, enqueued_at, attempt = await self.queue.get()
+            started = time.monotonic()
+            self.in_flight += 1
+            record = {"file": path.name, "wait_s": round(started - enqueued_at, 3)}
+            # 重试时单独用一个进程执行，再次崩溃只影响该文件本身
+            isolated = attempt > 0
+            pool = ProcessPoolExecutor(max_workers=1) if isolated else self.pool
+            try:
+                stats = await loop.run_in_executor(
+                    pool, repair_job, str(path), str(self.output_dir), CUT, WRITE_DEBUG, profiler.enabled
+                )
+                report = stats.pop('profile', None)
+                if report:
+                    profiler.merge(report)
+                self.completed += 1
+                self.points += stats['points']
+                record.update(status="ok", points=stats['points'], decisions=stats['decisions'])
+            except BrokenProcessPool as exc:
+                # 同一池中正在执行的任务都会收到该异常，不一定是这个文件的问题：重建进程池，任务重新排队
+                self._replace_pool(pool)
+                if attempt < JOB_RETRIES:
+                    record.update(status="retry", error=f"{type(exc).__name__}: {exc}")
+                    self.queue.put_nowait((path, enqueued_at, attempt + 1))
+                else:
+                    self.failed += 1
+                    record.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+            except Exception as exc:
+                self.failed += 1
+                record.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+            finally:
+                if isolated:
+                    pool.shutdown(wait=False)
+                elapsed = time.monotonic() - started
+                self.busy_seconds += elapsed
+                self.in_flight -= 1
+                record["run_s"] = round(elapsed, 3)
+                record["latency_s"] = round(time.monotonic() - enqueued_at, 3)
+                self.recent.append(record)
+                self.queue.task_done()
+            print(f"[watch] {record['status']}: {path.name} 用时 {record['run_s']}s")
+
+    # ---------- 状态 ----------
+    def status(self):
+        uptime = max(time.time() - self.started_at, 1e-9)
+        latencies = [r['latency_s'] for r in self.recent if r['status'] == 'ok']
+        return {
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "uptime_s": round(uptime, 1),
+            "queue_depth": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "max_workers": self.max_workers,
+            "arrived": self.arrived,
+            "completed": self.completed,
+            "failed": self.failed,
+            "arrival_per_min": round(self.arrived / uptime * 60, 3),
+            "throughput_per_min": round((self.completed + self.failed) / uptime * 60, 3),
+            "points_per_s": round(self.points / self.busy_seconds, 1) if self.busy_seconds else None,
+            # 进程池繁忙比例，接近 1 说明需要加大 MAX_WORKERS
+            "utilization": round(self.busy_seconds / (uptime * self.max_workers), 3),
+            "mean_latency_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "recent_jobs": list(self.recent),
+        }
+
+    async def reporter(self):
+        while not self.stop_event.is_set():
+            _atomic_write_text(STATUS_FILE, json.dumps(self.status(), ensure_ascii=False, indent=2))
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), STATUS_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        _atomic_write_text(STATUS_FILE, json.dumps(self.status(), ensure_ascii=False, indent=2))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows 下由 KeyboardInterrupt 结束
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        print(f"[watch] 监视 {self.watch_dir}，输出到 {self.output_dir}，进程数 {self.max_workers}")
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            workers = [asyncio.create_task(self.worker()) for _ in range(self.max_workers)]
+            reporter = asyncio.create_task(self.reporter())
+            await self.scanner()
+            # 停止后等待已在执行的任务结束，丢弃尚未开始的任务
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.queue.task_done()
+            await self.queue.join()
+            for task in workers:
+                task.cancel()
+            await reporter
+        finally:
+            self.pool.shutdown()
+        print("[watch] 已停止")
+
+
+def main():
+    asyncio.run(WatchDaemon().run())
+
+
+if __name__ == '__main__':
+    main()